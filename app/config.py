@@ -7,20 +7,90 @@ APP_NAME = "Polygraf Audio Backend"
 APP_ENV = os.getenv("APP_ENV", "development")
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(BASE_DIR, "data"))
 LOG_DIR = os.path.join(BASE_DIR, "logs")
 UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
+PARTIAL_UPLOAD_DIR = os.path.join(DATA_DIR, "partial_uploads")
+# Node-local working space: uploads before they reach the blob store and
+# media fetched from it.
+SCRATCH_DIR = os.path.join(DATA_DIR, "scratch")
 
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(LOG_DIR, exist_ok=True)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(PARTIAL_UPLOAD_DIR, exist_ok=True)
+os.makedirs(SCRATCH_DIR, exist_ok=True)
+
+# Where job media, diarization and decoded PCM live: "local" (UPLOAD_DIR, all
+# services share ./data) or "s3" (any S3-compatible store, so services can
+# run on separate hosts).
+BLOB_STORE = os.getenv("BLOB_STORE", "local")
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_REGION = os.getenv("S3_REGION")
+# Decoded PCM is stored in parts of this length; a part becomes readable by
+# transcribers as soon as the splitter has written it. Must match on the
+# splitter and the transcribers.
+PCM_PART_SECONDS = int(os.getenv("PCM_PART_SECONDS", 60))
+
+# Uploads are streamed to disk UPLOAD_CHUNK_SIZE bytes at a time.
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 8 * 1024 ** 3))
+ALLOWED_MEDIA_EXTENSIONS = os.getenv("ALLOWED_MEDIA_EXTENSIONS", ".wav,.mp4,.webm,.m4a").lower().split(",")
+
+# Anything other than .wav is decoded by streaming it through ffmpeg.
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
 
 WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_POOL_SIZE = int(os.getenv("WHISPER_POOL_SIZE", 1))
+
+# Batching: a transcriber drains up to TRANSCRIBE_BATCH_SIZE chunks, waiting at
+# most TRANSCRIBE_BATCH_WAIT_MS for the batch to fill. A size of 1 keeps the
+# one-chunk-at-a-time behaviour.
+TRANSCRIBE_BATCH_SIZE = int(os.getenv("TRANSCRIBE_BATCH_SIZE", 1))
+TRANSCRIBE_BATCH_WAIT_MS = int(os.getenv("TRANSCRIBE_BATCH_WAIT_MS", 200))
+
+# ASR engine: "whisper" (openai-whisper, fp32), "faster-whisper"
+# (CTranslate2, ASR_COMPUTE_TYPE quantization, e.g. int8 on CPU) or "stub".
+ASR_BACKEND = os.getenv("ASR_BACKEND", "whisper")
+ASR_COMPUTE_TYPE = os.getenv("ASR_COMPUTE_TYPE", "int8")
+ASR_BEAM_SIZE = int(os.getenv("ASR_BEAM_SIZE", 1))
+# Simulated ASR cost of the "stub" backend, in seconds per audio second.
+ASR_STUB_RTF = float(os.getenv("ASR_STUB_RTF", 0))
+
+# Transcriber supervisor: 0 means one process per physical core, and the
+# cores split evenly between processes for torch intra-op threads.
+TRANSCRIBER_PROCESSES = int(os.getenv("TRANSCRIBER_PROCESSES", 0))
+TRANSCRIBER_THREADS_PER_PROCESS = int(os.getenv("TRANSCRIBER_THREADS_PER_PROCESS", 0))
+
+# The splitter decodes and resamples the recording in blocks of this length.
+SPLITTER_BLOCK_SECONDS = float(os.getenv("SPLITTER_BLOCK_SECONDS", 30))
+# Transcription tasks are pushed in groups of this many per Redis round-trip.
+SPLITTER_ENQUEUE_BATCH = int(os.getenv("SPLITTER_ENQUEUE_BATCH", 32))
+
+# Segment shaping before transcription: frames quieter than VAD_THRESHOLD_DB
+# (dBFS) are silence, leading/trailing silence is trimmed down to
+# VAD_PADDING_MS and segments with less than VAD_MIN_SPEECH_MS of speech are
+# dropped. Same-speaker segments closer than SEGMENT_MERGE_GAP_MS are merged,
+# and anything longer than SEGMENT_MAX_MS is cut at the quietest frame in the
+# last SEGMENT_SPLIT_SEARCH_MS before the limit.
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() == "true"
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", 30))
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", -50))
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", 200))
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", 120))
+SEGMENT_MERGE_GAP_MS = int(os.getenv("SEGMENT_MERGE_GAP_MS", 1000))
+SEGMENT_MAX_MS = int(os.getenv("SEGMENT_MAX_MS", 30000))
+SEGMENT_SPLIT_SEARCH_MS = int(os.getenv("SEGMENT_SPLIT_SEARCH_MS", 8000))
 
 ##################Gemini api data and prompt.#########################
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL_NAME = os.getenv("GENAI_MODEL", "gemini-2.5-flash")
+# Points the Gemini client at another endpoint, e.g. a local fake server.
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")
 
 DEFAULT_PROMPT = (
     "You are a meeting summarizer, you must-"
@@ -32,7 +102,48 @@ DEFAULT_PROMPT = (
     "No prose outside the JSON. Use only facts present in the input."
 )
 GEMINI_PROMPT_INSTRUCTION = os.getenv("GEMINI_PROMPT_INSTRUCTION", DEFAULT_PROMPT)
-if not GEMINI_API_KEY:
+
+DEFAULT_MERGE_PROMPT = (
+    "You are merging partial summaries of consecutive parts of one meeting, "
+    "given in chronological order. You must-"
+    "Return only strict JSON with keys "
+    "keypoints (array of strings, 3-10), "
+    "decisions (array of strings), "
+    "action_items (array of {owner, task, due_date}), "
+    "per_speaker_summary (object mapping speaker -> short summary). "
+    "Deduplicate repeated items. No prose outside the JSON. "
+    "Use only facts present in the partial summaries."
+)
+GEMINI_MERGE_INSTRUCTION = os.getenv("GEMINI_MERGE_INSTRUCTION", DEFAULT_MERGE_PROMPT)
+
+# "gemini" calls the API; "stub" is a local, deterministic stand-in.
+SUMMARY_LLM_BACKEND = os.getenv("SUMMARY_LLM_BACKEND", "gemini")
+# Map-reduce: transcripts are summarized in windows of SUMMARY_WINDOW_MS and
+# partials are merged SUMMARY_REDUCE_FAN_IN at a time.
+SUMMARY_WINDOW_MS = int(os.getenv("SUMMARY_WINDOW_MS", 10 * 60 * 1000))
+SUMMARY_REDUCE_FAN_IN = int(os.getenv("SUMMARY_REDUCE_FAN_IN", 8))
+# A summarizer process works on up to SUMMARY_JOB_CONCURRENCY jobs at once
+# and keeps at most SUMMARY_MAX_CONCURRENCY LLM requests in flight.
+SUMMARY_JOB_CONCURRENCY = int(os.getenv("SUMMARY_JOB_CONCURRENCY", 8))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", 16))
+# Request and token budgets per minute for each summarizer process (0 means
+# unlimited). Token use is estimated as prompt characters / 4 plus
+# SUMMARY_LLM_OUTPUT_TOKENS.
+SUMMARY_LLM_RPM = int(os.getenv("SUMMARY_LLM_RPM", 60))
+SUMMARY_LLM_TPM = int(os.getenv("SUMMARY_LLM_TPM", 250000))
+SUMMARY_LLM_OUTPUT_TOKENS = int(os.getenv("SUMMARY_LLM_OUTPUT_TOKENS", 1024))
+# Each LLM request times out after SUMMARY_LLM_TIMEOUT seconds. Timeouts,
+# 429s and 5xx responses are retried up to SUMMARY_LLM_MAX_RETRIES times
+# with jittered exponential backoff capped at SUMMARY_LLM_BACKOFF_MAX.
+SUMMARY_LLM_TIMEOUT = float(os.getenv("SUMMARY_LLM_TIMEOUT", 120))
+SUMMARY_LLM_MAX_RETRIES = int(os.getenv("SUMMARY_LLM_MAX_RETRIES", 5))
+SUMMARY_LLM_BACKOFF_BASE = float(os.getenv("SUMMARY_LLM_BACKOFF_BASE", 1))
+SUMMARY_LLM_BACKOFF_MAX = float(os.getenv("SUMMARY_LLM_BACKOFF_MAX", 60))
+# Incremental mode: each time this many more chunks (counted from the start
+# of the meeting, without gaps) are transcribed, that window is summarized
+# ahead of time. 0 turns it off.
+SUMMARY_INCREMENTAL_CHUNKS = int(os.getenv("SUMMARY_INCREMENTAL_CHUNKS", 0))
+if not GEMINI_API_KEY and SUMMARY_LLM_BACKEND == "gemini":
     print(f"Warning: GEMINI_API_KEY not found in .env file.")
 
 #####################################################################
@@ -41,9 +152,68 @@ if not GEMINI_API_KEY:
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
+# Connections per process; API requests wait up to REDIS_POOL_TIMEOUT seconds
+# for a free one.
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
+
+# Content-addressed cache of transcripts (by PCM + model) and summaries (by
+# prompt + model).
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+# Reliable queues: a reserved task that is not acked within the visibility
+# timeout is handed out again; after QUEUE_MAX_DELIVERIES it is dead-lettered.
+QUEUE_VISIBILITY_TIMEOUT = int(os.getenv("QUEUE_VISIBILITY_TIMEOUT", 600))
+QUEUE_MAX_DELIVERIES = int(os.getenv("QUEUE_MAX_DELIVERIES", 3))
+QUEUE_REAP_INTERVAL = float(os.getenv("QUEUE_REAP_INTERVAL", 5))
+
+# Fair-share queues keep one sub-queue per job and hand out tasks in
+# proportion to the job's priority (1 to JOB_MAX_PRIORITY).
+FAIR_SHARE_QUEUES = [name for name in os.getenv("FAIR_SHARE_QUEUES", "queue:transcription").split(",") if name]
+JOB_DEFAULT_PRIORITY = int(os.getenv("JOB_DEFAULT_PRIORITY", 1))
+JOB_MAX_PRIORITY = int(os.getenv("JOB_MAX_PRIORITY", 10))
+
+# Retention, in seconds (0 keeps forever). Media and diarization are removed
+# RETENTION_MEDIA_SECONDS after a job finishes, and all of a job's state,
+# transcripts and results RETENTION_JOB_SECONDS after it finishes (or after
+# it was created, if it never does). Abandoned resumable uploads and
+# node-local scratch files are removed once untouched for their TTL. The
+# sweeper runs every RETENTION_SWEEP_INTERVAL seconds.
+RETENTION_MEDIA_SECONDS = int(os.getenv("RETENTION_MEDIA_SECONDS", 24 * 3600))
+RETENTION_JOB_SECONDS = int(os.getenv("RETENTION_JOB_SECONDS", 7 * 24 * 3600))
+RETENTION_UPLOAD_SECONDS = int(os.getenv("RETENTION_UPLOAD_SECONDS", 24 * 3600))
+RETENTION_SCRATCH_SECONDS = int(os.getenv("RETENTION_SCRATCH_SECONDS", 6 * 3600))
+RETENTION_SWEEP_INTERVAL = float(os.getenv("RETENTION_SWEEP_INTERVAL", 300))
+RETENTION_SWEEP_BATCH = int(os.getenv("RETENTION_SWEEP_BATCH", 100))
+
+# Admission control on new jobs. A job's cost is its speech time plus
+# ADMISSION_SEGMENT_SECONDS per diarization segment, and the cluster's
+# throughput is the audio transcribed per second over the busy minutes of the
+# last ADMISSION_THROUGHPUT_WINDOW seconds (ADMISSION_DEFAULT_THROUGHPUT until
+# anything has been measured). A job is refused with 429 when the outstanding
+# work, itself included, would take longer than ADMISSION_MAX_WAIT_SECONDS,
+# when ADMISSION_MAX_JOBS jobs are already in flight (0 = no limit), or with
+# 503 when less than ADMISSION_MIN_FREE_BYTES of disk is left. The sweeper
+# releases admissions that still have no job ADMISSION_STALE_SECONDS after it
+# first sees them, left by an API that died before enqueueing the job.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", 3600))
+ADMISSION_MAX_JOBS = int(os.getenv("ADMISSION_MAX_JOBS", 0))
+ADMISSION_SEGMENT_SECONDS = float(os.getenv("ADMISSION_SEGMENT_SECONDS", 0.5))
+ADMISSION_DEFAULT_THROUGHPUT = float(os.getenv("ADMISSION_DEFAULT_THROUGHPUT", 1.0))
+ADMISSION_THROUGHPUT_WINDOW = int(os.getenv("ADMISSION_THROUGHPUT_WINDOW", 900))
+ADMISSION_MIN_FREE_BYTES = int(os.getenv("ADMISSION_MIN_FREE_BYTES", 1024 ** 3))
+ADMISSION_STALE_SECONDS = int(os.getenv("ADMISSION_STALE_SECONDS", 900))
 
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", 8000))
+# Finished job documents kept in memory by each API process.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 256))
+# Seconds between keep-alive comments on idle job event streams.
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", 15))
+# Open job event streams per API process; more get 503.
+EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS", 1000))
 
 LOG_FILE = os.path.join(LOG_DIR, "backend.log")
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
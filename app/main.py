@@ -1,11 +1,28 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.logger import logger
+from app.services.redis_service import async_redis_client
+from app.services.events import job_event_hub
 from app.routes.jobs import router as jobs_router
+from app.routes.uploads import router as uploads_router
+from app.routes.metrics import router as metrics_router
+from app.routes.admin import router as admin_router
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    await async_redis_client.connect()
+    await job_event_hub.start()
+    yield
+    await job_event_hub.stop()
+    await async_redis_client.close()
+
+app = FastAPI(lifespan=lifespan)
 logger.info("Fast api started")
 
 app.include_router(jobs_router)
+app.include_router(uploads_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
 
 @app.get("/health")
 def health():
@@ -0,0 +1,46 @@
+import asyncio
+from app.config import SCRATCH_DIR, PARTIAL_UPLOAD_DIR
+from app.services.redis_service import async_redis_client
+from app.services.blob_store import blob_store
+from app.services.retention import job_prefix, directory_usage
+from app.logger import get_logger
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+logger = get_logger(__name__)
+
+async def job_storage(job_id):
+    storage = await async_redis_client.getJobStorage(job_id)
+    blob_objects, blob_bytes = await run_in_threadpool(blob_store.usage, job_prefix(job_id))
+    return {"job_id": job_id, **storage, "blob_objects": blob_objects, "blob_bytes": blob_bytes}
+
+@router.get("/storage")
+async def get_storage(offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+
+    job_ids, total = await async_redis_client.getRetainedJobs(offset, limit)
+    jobs = await asyncio.gather(*(job_storage(job_id) for job_id in job_ids))
+
+    # Scratch and partial uploads are local to the API node that answers.
+    scratch_bytes, partial_upload_bytes = await asyncio.gather(
+        run_in_threadpool(directory_usage, SCRATCH_DIR),
+        run_in_threadpool(directory_usage, PARTIAL_UPLOAD_DIR),
+    )
+
+    return {
+        "redis_used_memory": await async_redis_client.getRedisMemory(),
+        "scratch_bytes": scratch_bytes,
+        "partial_upload_bytes": partial_upload_bytes,
+        "jobs_total": total,
+        "offset": offset,
+        "jobs": jobs,
+    }
+
+@router.get("/storage/{job_id}")
+async def get_job_storage(job_id):
+
+    storage = await job_storage(job_id)
+    if not storage["redis_keys"] and not storage["blob_objects"] and storage["expires_at"] is None:
+        raise HTTPException(status_code=404, detail=f"Job with {job_id}, not found")
+    return storage
@@ -1,11 +1,26 @@
 import uuid
 import os
+import asyncio
+import time
 import shutil
 import json
-from app.config import UPLOAD_DIR
-from app.services.redis_service import redis_client
+from app.config import SCRATCH_DIR, EVENTS_KEEPALIVE_SECONDS, JOB_DEFAULT_PRIORITY, JOB_MAX_PRIORITY
+from app.services.redis_service import async_redis_client
+from app.services.events import job_event_hub
+from app.services.results import FinalDocument, build_final_response, final_documents
+from app.services.blob_store import blob_store
+from app.services.admission import admit_job, release_job
+from app.services.uploads import (
+    media_extension,
+    receive_form,
+    check_checksum,
+    validate_media,
+    validate_diarization,
+)
 from app.logger import get_logger
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 
 
 router = APIRouter(tags=["jobs"])
@@ -13,105 +28,166 @@ logger = get_logger(__name__)
 
 logger.info("-- Inside app.routes.jobs --")
 
-def format_transcripts(transcripts_list):
-
-    if not transcripts_list:
-        return {}
-
-    logger.info("Inside format_transcripts in app.routes.jobs")
-
-    people = {}
-    how_many = {}
-    speakers = []
-
-    for transcript in transcripts_list:
-        person = transcript.get("speaker", "Unknown")
-        words = transcript.get("text", "")
+def check_priority(priority):
+    if priority is None:
+        return JOB_DEFAULT_PRIORITY
+    if not 1 <= priority <= JOB_MAX_PRIORITY:
+        reason = f"priority must be between 1 and {JOB_MAX_PRIORITY}"
+        raise HTTPException(status_code=400, detail=reason)
+    return priority
 
-        if words.strip() != "":
-            if person not in people:
-                people[person] = []
-            people[person].append(words)
-            if person in how_many:
-                how_many[person] = how_many[person] + 1
-            else:
-                how_many[person] = 1
+async def store_job_files(job_id, media_path, json_path, file_extension):
+    # Both files are moved out of local scratch into the blob store; workers
+    # only ever see the keys.
+    media_key = f"{job_id}/media{file_extension}"
+    json_key = f"{job_id}/diarization.json"
 
-    for p in people:
-        speakers.append(p)
+    await run_in_threadpool(blob_store.put_file, media_key, media_path)
+    await run_in_threadpool(blob_store.put_file, json_key, json_path)
+    return media_key, json_key
 
-    logger.info(
-        {
-            "per_person": people,
-            "speakers": speakers,
-            "counts": how_many
-        }
-    )
+async def enqueue_job(job_id, media_key, json_key, media_sha256=None, priority=JOB_DEFAULT_PRIORITY):
+    await async_redis_client.jobCreation(job_id, priority)
 
-    return {
-        "per_person": people, 
-        "speakers": speakers, 
-        "counts": how_many
-    }
+    payload = {}
+    payload["job_id"] = job_id
+    payload["media_key"] = media_key
+    payload["json_key"] = json_key
+    payload["priority"] = priority
 
+    if media_sha256:
+        payload["media_sha256"] = media_sha256
 
-def save_into_file(path, data):
-    with open(path, "wb") as f:
-        f.write(data)
+    logger.info(f"Task payloadd: {payload}")
+    await async_redis_client.pushIntoQueue("queue:splitting", payload)
+    return {"job_id": job_id, "status": "queued"}
+
+# The body is parsed by receive_form rather than declared as File/Form
+# parameters, so the form is documented here.
+SUBMIT_JOB_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file", "diarization_json"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "diarization_json": {"type": "string", "format": "binary"},
+                        "sha256": {"type": "string"},
+                        "priority": {"type": "integer"},
+                    },
+                },
+            },
+        },
+    },
+}
+
+def form_priority(fields):
+    priority = fields.get("priority")
+    if not priority:
+        return check_priority(None)
+    try:
+        return check_priority(int(priority))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="priority must be an integer")
 
-@router.post("/jobs", status_code=202)
-async def submit_job(file: UploadFile = File(...), diarization_json: UploadFile = File(...)):
+@router.post("/jobs", status_code=202, openapi_extra=SUBMIT_JOB_FORM)
+async def submit_job(request: Request):
 
     logger.info("-- Inside submit_job in app.routes.jobs --")
 
     job_id = str(uuid.uuid4())
-    job_path = os.path.join(UPLOAD_DIR, job_id)
+    job_path = os.path.join(SCRATCH_DIR, job_id)
 
     if not os.path.exists(job_path):
         os.makedirs(job_path, exist_ok=True)
 
-    file_extension = os.path.splitext(file.filename)[1]
-    local_media_path = os.path.join(job_path, f"media{file_extension}")
     local_json_path = os.path.join(job_path, "diarization.json")
 
-    media_contents = json_contents = b""
+    def part_path(name, filename):
+        # The media extension is checked as soon as its part starts.
+        if name == "file":
+            return os.path.join(job_path, f"media{media_extension(filename)}")
+        if name == "diarization_json":
+            return local_json_path
+        return None
 
     try:
-        media_contents = await file.read()
-        save_into_file(local_media_path, media_contents)
-
-        json_contents = await diarization_json.read()
-        save_into_file(local_json_path, json_contents)
+        fields, files = await receive_form(request, part_path)
+        media = files.get("file")
+        diarization = files.get("diarization_json")
+
+        if not media or not diarization or not media["size"] or not diarization["size"]:
+            logger.error(f"Job {job_id} failed. No files found")
+            reason = "There were no files found"
+            raise HTTPException(status_code=400, detail=reason)
+
+        priority = form_priority(fields)
+        local_media_path = media["path"]
+        file_extension = os.path.splitext(local_media_path)[1]
+        media_size, media_sha256 = media["size"], media["sha256"]
+
+        check_checksum(fields.get("sha256"), media_sha256)
+        await validate_media(local_media_path, file_extension)
+        diarization_data = await validate_diarization(local_json_path)
+        admission = await admit_job(job_id, diarization_data)
+
+        try:
+            media_key, json_key = await store_job_files(job_id, local_media_path, local_json_path, file_extension)
+        except Exception:
+            await release_job(job_id)
+            raise
+
+    except HTTPException:
+        raise
 
     except Exception as e:
         logger.error(f"Failed to save files {job_id}: {e}")
         reason = "Failed to save uploaded files"
         raise HTTPException(status_code=500, detail=reason)
 
-    if not media_contents or not json_contents:
-        logger.error(f"Job {job_id} failed. No files found")
-        reason = "There were no files found"
-        raise HTTPException(status_code=400, detail=reason)
+    finally:
+        await run_in_threadpool(shutil.rmtree, job_path, True)
 
-    redis_client.jobCreation(job_id)
+    logger.info(f"Job {job_id}: received {media_size} bytes, sha256 {media_sha256}")
+    try:
+        queued = await enqueue_job(job_id, media_key, json_key, media_sha256, priority)
+    except Exception:
+        await release_job(job_id)
+        raise
+    return {**queued, **admission}
 
-    payload = {}
-    payload["job_id"] = job_id
-    payload["media_path"] = local_media_path
-    payload["json_path"] = local_json_path
-    payload["job_dir"] = job_path
+def document_response(document, request):
+    headers = {"ETag": document.etag, "Vary": "Accept-Encoding"}
 
-    logger.info(f"Task payloadd: {payload}")
-    redis_client.pushIntoQueue("queue:splitting", payload)
-    return {"job_id": job_id, "status": "queued"} 
+    if request.headers.get("if-none-match") == document.etag:
+        return Response(status_code=304, headers=headers)
+
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(document.gzipped, media_type="application/json", headers=headers)
+
+    return Response(document.body, media_type="application/json", headers=headers)
 
 @router.get("/jobs/{job_id}")
-def get_job_status(job_id):
+async def get_job_status(job_id, request: Request):
+
+    logger.debug("-- Inside get_job_status in app.routes.jobs --")
+
+    document = final_documents.get(job_id)
+    if document is None:
+        body = await async_redis_client.getFinalResult(job_id)
+        if body:
+            document = await run_in_threadpool(FinalDocument, body)
+            final_documents.put(job_id, document)
 
-    logger.info("-- Inside get_job_status in app.routes.jobs --")
+    if document is not None:
+        return document_response(document, request)
 
-    job_data = redis_client.get_job_status(job_id)
-    logger.info(f"job_data: {job_data}")
+    job_data = await async_redis_client.get_job_status(job_id)
+    logger.debug(f"job_data: {job_data}")
 
     if not job_data:
         logger.error(f"Job data not found; {job_data}")
@@ -120,10 +196,10 @@ def get_job_status(job_id):
     
     job_status = job_data.get("status")
     if job_status == "complete":
+        # Jobs finished before final documents were materialized.
         logger.info(f"{job_id} is completed")
 
-        transcripts_list = redis_client.getTranscripts(job_id)
-        formatted_transcripts = format_transcripts(transcripts_list)
+        transcripts_list = await async_redis_client.getTranscripts(job_id)
         
         summary = {}
         if "result" in job_data:
@@ -134,12 +210,90 @@ def get_job_status(job_id):
                     "raw": job_data["result"]
                 }
         
-        final_response = {
-            "job_id": job_id,
-            "status": "complete",
-            "summary": summary,
-            **formatted_transcripts
-        }
-        return final_response
-    
-    return job_data
\ No newline at end of file
+        return build_final_response(job_id, summary, transcripts_list)
+
+    if "partial_summary" in job_data:
+        try:
+            job_data["partial_summary"] = json.loads(job_data["partial_summary"])
+        except:
+            pass
+
+    depth, oldest = await async_redis_client.getJobQueue("queue:transcription", job_id)
+    job_data["queue_depth"] = depth
+    if oldest:
+        job_data["oldest_queued_ms"] = max(0, int((time.time() - oldest) * 1000))
+    dispatched = int(job_data.pop("queue_dispatched", 0) or 0)
+    wait_ms = int(job_data.pop("queue_wait_ms", 0) or 0)
+    if dispatched:
+        job_data["avg_queue_wait_ms"] = wait_ms // dispatched
+
+    return job_data
+
+@router.get("/jobs/{job_id}/transcripts")
+async def get_job_transcripts(job_id, speaker: str = None, start_ms: int = None, end_ms: int = None):
+
+    logger.debug("-- Inside get_job_transcripts in app.routes.jobs --")
+
+    job_data = await async_redis_client.get_job_status(job_id)
+    if not job_data:
+        reason = f"Job with {job_id}, not found"
+        raise HTTPException(status_code=404, detail=reason)
+
+    speakers = [speaker] if speaker else None
+    transcripts_list = await async_redis_client.getTranscripts(job_id, start_ms, end_ms, speakers)
+    return {"job_id": job_id, "status": job_data.get("status"), "transcripts": transcripts_list}
+
+
+TERMINAL_STATUSES = ("complete", "failed")
+
+def sse_event(event):
+    return f"event: status\ndata: {json.dumps(event)}\n\n"
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id, request: Request):
+
+    logger.info("-- Inside stream_job_events in app.routes.jobs --")
+
+    # Listen before taking the snapshot so no transition falls in between.
+    queue = job_event_hub.open(job_id)
+    try:
+        job_data = await async_redis_client.get_job_status(job_id)
+    except Exception:
+        job_event_hub.close(job_id, queue)
+        raise
+
+    if not job_data:
+        job_event_hub.close(job_id, queue)
+        reason = f"Job with {job_id}, not found"
+        raise HTTPException(status_code=404, detail=reason)
+
+    snapshot = {}
+    for field in ("status", "error"):
+        if field in job_data:
+            snapshot[field] = job_data[field]
+    for field in ("processed_chunks", "total_chunks"):
+        if field in job_data:
+            snapshot[field] = int(job_data[field])
+
+    async def events():
+        try:
+            yield sse_event(snapshot)
+            if snapshot.get("status") in TERMINAL_STATUSES:
+                return
+
+            while not await request.is_disconnected():
+                try:
+                    data = await asyncio.wait_for(queue.get(), EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                event = json.loads(data)
+                yield sse_event(event)
+                if event.get("status") in TERMINAL_STATUSES:
+                    return
+        finally:
+            job_event_hub.close(job_id, queue)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
@@ -0,0 +1,19 @@
+from app.services.redis_service import async_redis_client
+from app.services.metrics import render_metrics
+from app.logger import get_logger
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+
+router = APIRouter(tags=["metrics"])
+logger = get_logger(__name__)
+
+QUEUE_NAMES = ["queue:splitting", "queue:transcription", "queue:summary"]
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    histograms, counters, cache_stats = await async_redis_client.getMetrics()
+    queue_depths = await async_redis_client.getQueueDepths(QUEUE_NAMES)
+
+    body = render_metrics(histograms, counters, queue_depths, cache_stats)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
@@ -0,0 +1,198 @@
+import uuid
+import os
+import shutil
+import asyncio
+from contextlib import suppress
+from app.config import SCRATCH_DIR, PARTIAL_UPLOAD_DIR, UPLOAD_MAX_BYTES, JOB_DEFAULT_PRIORITY
+from app.services.redis_service import async_redis_client
+from app.services.uploads import (
+    media_extension,
+    iter_upload,
+    stream_to_file,
+    file_sha256,
+    check_checksum,
+    validate_media,
+    validate_diarization,
+)
+from app.routes.jobs import enqueue_job, check_priority, store_job_files
+from app.services.admission import admit_job, release_job
+from app.logger import get_logger
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Header, Request
+from fastapi.concurrency import run_in_threadpool
+
+
+router = APIRouter(tags=["uploads"])
+logger = get_logger(__name__)
+
+logger.info("-- Inside app.routes.uploads --")
+
+UPLOAD_LOCK_SECONDS = 300
+
+class UploadLock:
+    # Held for a whole PATCH or complete and renewed while it runs, however
+    # long the body or the move into the blob store takes. Only the holder
+    # can renew or release it.
+    def __init__(self, upload_id):
+        self.name = f"upload:{upload_id}"
+        self.token = uuid.uuid4().hex
+        self._renewer = None
+
+    async def __aenter__(self):
+        if not await async_redis_client.acquireLock(self.name, UPLOAD_LOCK_SECONDS, self.token):
+            raise HTTPException(status_code=409, detail="Another part of this upload is in progress")
+        self._renewer = asyncio.create_task(self._renew())
+        return self
+
+    async def __aexit__(self, *exc):
+        self._renewer.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._renewer
+        await async_redis_client.releaseLock(self.name, self.token)
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(UPLOAD_LOCK_SECONDS / 3)
+            try:
+                if not await self.held():
+                    logger.warning(f"Lost lock {self.name}")
+                    return
+            except Exception as e:
+                logger.warning(f"Couldn't renew lock {self.name}: {e}")
+
+    async def held(self):
+        # Also renews it.
+        return await async_redis_client.extendLock(self.name, UPLOAD_LOCK_SECONDS, self.token)
+
+def partial_path(upload_id, upload):
+    return os.path.join(PARTIAL_UPLOAD_DIR, f"{upload_id}{upload['extension']}")
+
+def touch(path):
+    open(path, "wb").close()
+
+def current_offset(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+async def load_upload(upload_id):
+    upload = await async_redis_client.get_upload(upload_id)
+    if not upload:
+        reason = f"Upload with {upload_id}, not found"
+        raise HTTPException(status_code=404, detail=reason)
+    return upload
+
+@router.post("/uploads", status_code=201)
+async def create_upload(
+    filename: str = Form(...),
+    size: int = Form(None),
+    sha256: str = Form(None),
+    priority: int = Form(None),
+):
+
+    logger.info("-- Inside create_upload in app.routes.uploads --")
+
+    file_extension = media_extension(filename)
+    priority = check_priority(priority)
+
+    if size is not None and size > UPLOAD_MAX_BYTES:
+        reason = f"Upload exceeds the {UPLOAD_MAX_BYTES} byte limit"
+        raise HTTPException(status_code=413, detail=reason)
+
+    upload_id = str(uuid.uuid4())
+    meta = {"filename": filename, "extension": file_extension, "priority": priority}
+    if size is not None:
+        meta["size"] = size
+    if sha256:
+        meta["sha256"] = sha256.lower()
+
+    await async_redis_client.uploadCreation(upload_id, **meta)
+    await run_in_threadpool(touch, partial_path(upload_id, meta))
+
+    return {"upload_id": upload_id, "offset": 0}
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id):
+    upload = await load_upload(upload_id)
+    offset = current_offset(partial_path(upload_id, upload))
+    size = int(upload["size"]) if "size" in upload else None
+    return {"upload_id": upload_id, "offset": offset, "size": size}
+
+@router.patch("/uploads/{upload_id}")
+async def append_upload(upload_id, request: Request, upload_offset: int = Header(...)):
+
+    upload = await load_upload(upload_id)
+    path = partial_path(upload_id, upload)
+
+    async with UploadLock(upload_id):
+        offset = current_offset(path)
+        if upload_offset != offset:
+            reason = f"Upload-Offset {upload_offset} does not match current offset {offset}"
+            raise HTTPException(status_code=409, detail=reason, headers={"Upload-Offset": str(offset)})
+
+        received, void = await stream_to_file(request.stream(), path, mode="ab", written=offset)
+        await async_redis_client.touchUpload(upload_id)
+
+    offset += received
+    logger.info(f"Upload {upload_id}: +{received} bytes, offset {offset}")
+    return {"upload_id": upload_id, "offset": offset}
+
+@router.post("/uploads/{upload_id}/complete", status_code=202)
+async def complete_upload(upload_id, diarization_json: UploadFile = File(...)):
+
+    logger.info("-- Inside complete_upload in app.routes.uploads --")
+
+    # Same lock as PATCH: no part is written while the file is hashed and
+    # moved, and of two concurrent completes only one makes a job. The upload
+    # is deleted before the lock is released, so a later one gets 404.
+    async with UploadLock(upload_id) as lock:
+        return await finish_upload(upload_id, diarization_json, lock)
+
+async def finish_upload(upload_id, diarization_json, lock):
+    upload = await load_upload(upload_id)
+    path = partial_path(upload_id, upload)
+    offset = current_offset(path)
+
+    if "size" in upload and offset != int(upload["size"]):
+        reason = f"Upload incomplete: {offset} of {upload['size']} bytes received"
+        raise HTTPException(status_code=409, detail=reason)
+
+    media_sha256 = await file_sha256(path)
+    check_checksum(upload.get("sha256"), media_sha256)
+    await validate_media(path, upload["extension"])
+
+    job_id = str(uuid.uuid4())
+    job_path = os.path.join(SCRATCH_DIR, job_id)
+    os.makedirs(job_path, exist_ok=True)
+
+    local_json_path = os.path.join(job_path, "diarization.json")
+
+    try:
+        await stream_to_file(iter_upload(diarization_json), local_json_path)
+        diarization_data = await validate_diarization(local_json_path)
+        # A refused upload is kept, so the client can retry completing it.
+        admission = await admit_job(job_id, diarization_data)
+
+        # Last point to back out: past here the upload becomes this job.
+        if not await lock.held():
+            await release_job(job_id)
+            raise HTTPException(status_code=409, detail="Another part of this upload is in progress")
+
+        try:
+            media_key, json_key = await store_job_files(job_id, path, local_json_path, upload["extension"])
+        except Exception:
+            await release_job(job_id)
+            raise
+    finally:
+        await run_in_threadpool(shutil.rmtree, job_path, True)
+
+    await async_redis_client.deleteUpload(upload_id)
+
+    logger.info(f"Upload {upload_id} became job {job_id}: {offset} bytes, sha256 {media_sha256}")
+    priority = int(upload.get("priority") or JOB_DEFAULT_PRIORITY)
+    try:
+        queued = await enqueue_job(job_id, media_key, json_key, media_sha256, priority)
+    except Exception:
+        await release_job(job_id)
+        raise
+    return {**queued, **admission}
@@ -0,0 +1,93 @@
+import math
+import time
+import shutil
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from app.config import (
+    SCRATCH_DIR,
+    ADMISSION_ENABLED,
+    ADMISSION_MAX_WAIT_SECONDS,
+    ADMISSION_MAX_JOBS,
+    ADMISSION_SEGMENT_SECONDS,
+    ADMISSION_DEFAULT_THROUGHPUT,
+    ADMISSION_MIN_FREE_BYTES,
+    RETENTION_SWEEP_INTERVAL,
+)
+from app.services.redis_service import async_redis_client
+from app.services.blob_store import blob_store
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Cost is in seconds of audio to transcribe, the unit throughput is
+# measured in: the speech the diarization covers (silence between segments
+# is never transcribed) plus a fixed overhead per segment.
+
+def estimate_cost(diarization_data):
+    speech_ms = 0
+    audio_ms = 0
+    for segment in diarization_data:
+        start = int(segment.get("timestamp_ms") or 0)
+        duration = max(0, int(segment.get("duration_ms") or 0))
+        speech_ms += duration
+        audio_ms = max(audio_ms, start + duration)
+
+    segments = len(diarization_data)
+    return {
+        "audio_seconds": audio_ms / 1000,
+        "speech_seconds": speech_ms / 1000,
+        "segments": segments,
+        "cost": speech_ms / 1000 + segments * ADMISSION_SEGMENT_SECONDS,
+    }
+
+def free_bytes():
+    paths = [SCRATCH_DIR]
+    if blob_store.is_local:
+        paths.append(blob_store.root)
+    return min(shutil.disk_usage(path).free for path in paths)
+
+def reject(status_code, reason, retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    logger.warning(f"Refusing job: {reason}, retry after {retry_after}s")
+    raise HTTPException(status_code=status_code, detail=reason, headers={"Retry-After": str(retry_after)})
+
+async def admit_job(job_id, diarization_data):
+    # Either reserves the job's share of the cluster and returns its
+    # estimated wait, or raises 429/503 with a Retry-After.
+    if not ADMISSION_ENABLED:
+        return {}
+
+    estimate = estimate_cost(diarization_data)
+    throughput = await async_redis_client.getThroughput() or ADMISSION_DEFAULT_THROUGHPUT
+
+    if ADMISSION_MIN_FREE_BYTES and await run_in_threadpool(free_bytes) < ADMISSION_MIN_FREE_BYTES:
+        # Space comes back when the sweeper next removes expired media.
+        reject(503, "Not enough free disk space to accept new jobs", RETENTION_SWEEP_INTERVAL)
+
+    capacity = ADMISSION_MAX_WAIT_SECONDS * throughput
+    admitted, backlog, jobs = await async_redis_client.admitJob(job_id, estimate["cost"], capacity, ADMISSION_MAX_JOBS)
+
+    if not admitted:
+        if ADMISSION_MAX_JOBS and jobs >= ADMISSION_MAX_JOBS:
+            # Roughly until the average job in flight is done.
+            reason = f"{jobs} jobs are already in flight"
+            retry_after = backlog / jobs / throughput
+        else:
+            wait_seconds = (backlog + estimate["cost"]) / throughput
+            reason = f"Estimated wait of {wait_seconds:.0f}s exceeds {ADMISSION_MAX_WAIT_SECONDS:.0f}s"
+            retry_after = (backlog + estimate["cost"] - capacity) / throughput
+        reject(429, reason, retry_after)
+
+    wait_seconds = (backlog + estimate["cost"]) / throughput
+    logger.info(
+        f"Admitted job {job_id}: {estimate['speech_seconds']:.0f}s speech in {estimate['segments']} segments, "
+        f"{backlog:.0f}s of audio ahead at {throughput:.2f}x, ETA {wait_seconds:.0f}s"
+    )
+    return {
+        "estimated_wait_seconds": round(wait_seconds, 1),
+        "estimated_completion_at": round(time.time() + wait_seconds, 3),
+    }
+
+async def release_job(job_id):
+    if ADMISSION_ENABLED:
+        await async_redis_client.releaseAdmission(job_id)
@@ -1,26 +1,69 @@
 import os
-import moviepy.editor as mp
+import subprocess
+import tempfile
+import numpy as np
+from app.config import FFMPEG_BINARY, FFPROBE_BINARY, SPLITTER_BLOCK_SECONDS
+from app.services.chunk_store import SAMPLE_RATE, SAMPLE_DTYPE
 from app.logger import get_logger
 
 logger = get_logger(__name__)
 
 logger.info("Inside audio_extractor in app.services")
 
-def extract_audio(input_path, output_path):
+def has_audio_stream(input_path):
+    command = [
+        FFPROBE_BINARY, "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=codec_name",
+        "-of", "csv=p=0",
+        input_path,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    return result.returncode == 0 and bool(result.stdout.strip())
+
+def stream_audio(input_path, block_seconds=SPLITTER_BLOCK_SECONDS):
+    # ffmpeg only demuxes and decodes the first audio stream (-vn skips the
+    # video entirely) and resamples it to 16kHz mono float32 on stdout, so
+    # blocks arrive at roughly read speed without a full-rate WAV on disk.
+
+    logger.info(f"Streaming audio from: {input_path}")
 
-    logger.info(f"Video .mp4 path: {input_path}")
-    
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"file not found: {input_path}")
-    
-    try:
-        video = mp.VideoFileClip(input_path)
-        video.audio.write_audiofile(output_path, codec="pcm_s16le", verbose=False, logger=None)
-        
-        video.close()
-        logger.info(f"Audio extracted successfully: {output_path}")
-        return output_path
-    
-    except Exception as e:
-        logger.error(f"Failed extracting audio: {e}")
-        raise
\ No newline at end of file
+
+    command = [
+        FFMPEG_BINARY, "-nostdin", "-v", "error",
+        "-i", input_path,
+        "-map", "0:a:0", "-vn", "-sn", "-dn",
+        "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "-f", "f32le", "pipe:1",
+    ]
+    sample_size = np.dtype(SAMPLE_DTYPE).itemsize
+    block_bytes = max(1, int(block_seconds * SAMPLE_RATE)) * sample_size
+
+    # stderr goes to a file so a chatty ffmpeg can never block on a full pipe.
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            pending = b""
+            while True:
+                data = process.stdout.read(block_bytes)
+                if not data:
+                    break
+
+                data = pending + data
+                usable = len(data) - len(data) % sample_size
+                pending = data[usable:]
+                if usable:
+                    yield np.frombuffer(data[:usable], dtype="<f4").astype(SAMPLE_DTYPE)
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                process.kill()
+            returncode = process.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode("utf-8", "replace").strip()[-500:]
+            logger.error(f"ffmpeg failed on {input_path}: {message}")
+            raise RuntimeError(f"ffmpeg exited with {returncode}: {message}")
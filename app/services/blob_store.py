@@ -0,0 +1,211 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from app.config import (
+    UPLOAD_DIR,
+    SCRATCH_DIR,
+    BLOB_STORE,
+    S3_BUCKET,
+    S3_PREFIX,
+    S3_ENDPOINT_URL,
+    S3_REGION,
+)
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Job files are addressed by key ("<job_id>/media.wav", "<job_id>/pcm/...")
+# rather than by path, so the API and workers only need to share the store,
+# not a filesystem.
+
+
+class LocalBlobStore:
+    is_local = True
+
+    def __init__(self, root=UPLOAD_DIR):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def _temp_path(self, target):
+        # Writes land next to the target and are renamed over it, so readers
+        # (e.g. transcribers of a redelivered split) never see a partial file.
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".", suffix=".tmp")
+        os.close(fd)
+        return temp_path
+
+    def put_file(self, key, local_path):
+        # Takes ownership of local_path: it is moved into the store.
+        target = self.path(key)
+        if os.path.abspath(local_path) == os.path.abspath(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = self._temp_path(target)
+        try:
+            shutil.move(local_path, temp_path)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def put_bytes(self, key, data):
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = self._temp_path(target)
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def get_bytes(self, key):
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def read_range(self, key, offset, length):
+        with open(self.path(key), "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    @contextmanager
+    def local_copy(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"blob not found: {key}")
+        yield path
+
+    def delete_prefix(self, prefix):
+        target = self.path(prefix)
+        if os.path.isdir(target):
+            shutil.rmtree(target, ignore_errors=True)
+        elif os.path.exists(target):
+            os.remove(target)
+
+    def usage(self, prefix):
+        # (objects, bytes) stored under prefix.
+        objects, size = 0, 0
+        for dirpath, void, filenames in os.walk(self.path(prefix)):
+            for filename in filenames:
+                try:
+                    size += os.path.getsize(os.path.join(dirpath, filename))
+                    objects += 1
+                except FileNotFoundError:
+                    pass
+        return objects, size
+
+
+class S3BlobStore:
+    # Any S3-compatible service; S3_ENDPOINT_URL points it at MinIO or a
+    # local stand-in. Credentials come from the usual AWS_* variables.
+    is_local = False
+
+    def __init__(self, bucket=S3_BUCKET, prefix=S3_PREFIX, endpoint_url=S3_ENDPOINT_URL, region=S3_REGION):
+        import boto3
+
+        if not bucket:
+            raise RuntimeError("S3_BUCKET is not set.")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    def object_key(self, key):
+        return self.prefix + key
+
+    def _missing(self, error):
+        code = error.response.get("Error", {}).get("Code")
+        return code in ("NoSuchKey", "404", "NotFound")
+
+    def put_file(self, key, local_path):
+        # upload_file switches to parallel multipart uploads for large media.
+        self.client.upload_file(local_path, self.bucket, self.object_key(key))
+        os.remove(local_path)
+
+    def put_bytes(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=self.object_key(key), Body=data)
+
+    def get_bytes(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            resp = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(f"blob not found: {key}")
+            raise
+        return resp["Body"].read()
+
+    def read_range(self, key, offset, length):
+        from botocore.exceptions import ClientError
+
+        if length <= 0:
+            return b""
+
+        byte_range = f"bytes={offset}-{offset + length - 1}"
+        try:
+            resp = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key), Range=byte_range)
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(f"blob not found: {key}")
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                return b""
+            raise
+        return resp["Body"].read()
+
+    @contextmanager
+    def local_copy(self, key):
+        from botocore.exceptions import ClientError
+
+        suffix = os.path.splitext(key)[1]
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=SCRATCH_DIR)
+        os.close(fd)
+        try:
+            try:
+                self.client.download_file(self.bucket, self.object_key(key), path)
+            except ClientError as e:
+                if self._missing(e):
+                    raise FileNotFoundError(f"blob not found: {key}")
+                raise
+            yield path
+        finally:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def delete_prefix(self, prefix):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.object_key(prefix)):
+            objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True})
+
+    def usage(self, prefix):
+        objects, size = 0, 0
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.object_key(prefix)):
+            for item in page.get("Contents", []):
+                objects += 1
+                size += item["Size"]
+        return objects, size
+
+
+BLOB_STORES = {
+    "local": LocalBlobStore,
+    "s3": S3BlobStore,
+}
+
+def get_blob_store(backend=BLOB_STORE):
+    if backend not in BLOB_STORES:
+        raise ValueError(f"Unknown BLOB_STORE: {backend}")
+    logger.info(f"Using {backend} blob store")
+    return BLOB_STORES[backend]()
+
+
+blob_store = get_blob_store()
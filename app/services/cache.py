@@ -0,0 +1,62 @@
+import json
+import hashlib
+from app.config import CACHE_ENABLED, CACHE_TTL_SECONDS
+from app.services.redis_service import redis_client
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+STATS_KEY = "cache:stats"
+
+def content_digest(*parts):
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        hasher.update(hashlib.sha256(part).digest())
+    return hasher.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, namespace, ttl_seconds=CACHE_TTL_SECONDS, enabled=CACHE_ENABLED):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+
+    def _key(self, digest):
+        return f"cache:{self.namespace}:{digest}"
+
+    def get_many(self, digests):
+        if not self.enabled or not digests:
+            return [None] * len(digests)
+
+        values = redis_client.client.mget([self._key(digest) for digest in digests])
+        hits = sum(1 for value in values if value is not None)
+
+        pipe = redis_client.client.pipeline(transaction=False)
+        pipe.hincrby(STATS_KEY, f"{self.namespace}:hits", hits)
+        pipe.hincrby(STATS_KEY, f"{self.namespace}:misses", len(digests) - hits)
+        pipe.execute()
+
+        logger.info(f"Cache {self.namespace}: {hits} hits, {len(digests) - hits} misses")
+        return [None if value is None else json.loads(value) for value in values]
+
+    def get(self, digest):
+        return self.get_many([digest])[0]
+
+    def set_many(self, items):
+        if not self.enabled or not items:
+            return
+
+        pipe = redis_client.client.pipeline(transaction=False)
+        for digest, value in items:
+            pipe.set(self._key(digest), json.dumps(value), ex=self.ttl_seconds)
+        pipe.execute()
+
+    def set(self, digest, value):
+        self.set_many([(digest, value)])
+
+
+def cache_stats():
+    stats = redis_client.client.hgetall(STATS_KEY)
+    return {name: int(count) for name, count in stats.items()}
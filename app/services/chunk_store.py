@@ -0,0 +1,102 @@
+import os
+import tempfile
+import numpy as np
+from app.config import SCRATCH_DIR, PCM_PART_SECONDS
+from app.services.blob_store import blob_store
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+SAMPLE_RATE = 16000
+SAMPLE_DTYPE = np.float32
+SAMPLE_SIZE = np.dtype(SAMPLE_DTYPE).itemsize
+PART_SAMPLES = PCM_PART_SECONDS * SAMPLE_RATE
+
+def pcm_prefix(job_id):
+    return f"{job_id}/pcm/"
+
+def part_key(job_id, part):
+    return f"{pcm_prefix(job_id)}{part:06d}.f32"
+
+class PcmWriter:
+    # The splitter's side of the job PCM. Samples are spooled to a local file,
+    # which also serves the splitter's own reads (VAD trimming, splitting),
+    # and published to the blob store one PART_SAMPLES part at a time.
+    def __init__(self, job_id, store=blob_store):
+        self.job_id = job_id
+        self.store = store
+        self.spool = tempfile.TemporaryFile(dir=SCRATCH_DIR)
+        self.written = 0
+        self.published = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, samples):
+        self.spool.write(np.ascontiguousarray(samples, dtype=SAMPLE_DTYPE).data)
+        self.written += len(samples)
+
+        while self.written - self.published >= PART_SAMPLES:
+            self._publish(PART_SAMPLES)
+
+    def finish(self):
+        if self.written > self.published:
+            self._publish(self.written - self.published)
+
+    def _publish(self, num_samples):
+        part = self.published // PART_SAMPLES
+        data = self._pread(self.published, num_samples)
+        self.store.put_bytes(part_key(self.job_id, part), data)
+        self.published += num_samples
+
+    def _pread(self, offset, num_samples):
+        self.spool.flush()
+        return os.pread(self.spool.fileno(), num_samples * SAMPLE_SIZE, offset * SAMPLE_SIZE)
+
+    def read(self, offset, num_samples):
+        num_samples = min(offset + num_samples, self.written) - offset
+        if num_samples <= 0:
+            return np.zeros(0, dtype=SAMPLE_DTYPE)
+        return np.frombuffer(self._pread(offset, num_samples), dtype=SAMPLE_DTYPE).copy()
+
+    def close(self):
+        self.spool.close()
+
+def open_pcm(job_id):
+    logger.info(f"Writing 16kHz PCM for job {job_id} in {PCM_PART_SECONDS}s parts")
+    return PcmWriter(job_id)
+
+def read_chunk(job_id, offset, num_samples):
+    # Ranged reads of just the parts covering the chunk, so a transcriber on
+    # another host never fetches the whole recording.
+    end = offset + num_samples
+    position = offset
+    pieces = []
+
+    try:
+        while position < end:
+            part, start = divmod(position, PART_SAMPLES)
+            count = min(end - position, PART_SAMPLES - start)
+
+            data = blob_store.read_range(part_key(job_id, part), start * SAMPLE_SIZE, count * SAMPLE_SIZE)
+            pieces.append(np.frombuffer(data, dtype=SAMPLE_DTYPE))
+            if len(data) < count * SAMPLE_SIZE:
+                break
+            position += count
+    except FileNotFoundError:
+        logger.warning(f"PCM not found for job {job_id} at sample {position}")
+        return None
+
+    if not pieces:
+        return None
+    return np.concatenate(pieces)
+
+def remove_job_audio(job_id):
+    try:
+        blob_store.delete_prefix(pcm_prefix(job_id))
+        logger.info(f"Removed PCM for job {job_id}")
+    except Exception as e:
+        logger.error(f"Failed to remove PCM for job {job_id}: {e}")
@@ -1,15 +1,26 @@
 import os
 import json
 import re
-from pydub import AudioSegment
+import struct
+import numpy as np
 from app.logger import get_logger
-from app.config import DATA_DIR
+from app.config import (
+    SPLITTER_BLOCK_SECONDS,
+    VAD_ENABLED,
+    SEGMENT_MERGE_GAP_MS,
+    SEGMENT_MAX_MS,
+    SEGMENT_SPLIT_SEARCH_MS,
+)
+from app.services.chunk_store import SAMPLE_RATE, SAMPLE_DTYPE, open_pcm
+from app.services.vad import voiced_bounds, find_pause
+from app.services.audio_extractor import stream_audio
 
 logger = get_logger()
 logger.info("Inside consumer from app.routes")
 
-output_path = os.path.join(DATA_DIR, "sample_audio")
-os.makedirs(output_path, exist_ok=True)
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
 
 def read_file(json_path):
     if not json_path:
@@ -24,22 +35,129 @@ def read_file(json_path):
 
     return diarization_data
 
-def consume_diarized_segments(json_path, audio_path):
+def read_wav_header(audio_path):
+    with open(audio_path, "rb") as wav_file:
+        riff, void, wave_id = struct.unpack("<4sI4s", wav_file.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"Not a RIFF/WAVE file: {audio_path}")
 
-    logger.info(f"Check json path: {json_path}")
-    logger.info(f"Check for .wav audio file: {audio_path}")
+        header = None
+        while True:
+            chunk = wav_file.read(8)
+            if len(chunk) < 8:
+                raise ValueError(f"No data chunk in {audio_path}")
 
-    diarization_data = read_file(json_path)
-    full_audio = AudioSegment.from_wav(audio_path)
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk)
+
+            if chunk_id == b"fmt ":
+                fmt = wav_file.read(chunk_size + chunk_size % 2)
+                format_tag, channels, sample_rate = struct.unpack("<HHI", fmt[:8])
+                bits = struct.unpack("<H", fmt[14:16])[0]
+                if format_tag == WAVE_FORMAT_EXTENSIBLE:
+                    format_tag = struct.unpack("<H", fmt[24:26])[0]
+                header = {
+                    "format": format_tag,
+                    "channels": channels,
+                    "sample_rate": sample_rate,
+                    "sample_width": bits // 8,
+                }
+            elif chunk_id == b"data":
+                if header is None:
+                    raise ValueError(f"data chunk before fmt chunk in {audio_path}")
+
+                data_offset = wav_file.tell()
+                # Streamed recordings often leave the size field unset.
+                data_size = min(chunk_size, os.path.getsize(audio_path) - data_offset)
+                header["data_offset"] = data_offset
+                header["data_size"] = data_size
+                return header
+            else:
+                wav_file.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+def decode_frames(raw, header):
+    width = header["sample_width"]
+
+    if header["format"] == WAVE_FORMAT_IEEE_FLOAT and width == 4:
+        samples = np.frombuffer(raw, dtype="<f4").astype(np.float32)
+    elif header["format"] != WAVE_FORMAT_PCM:
+        raise ValueError(f"Unsupported WAV format tag {header['format']}")
+    elif width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        packed = triplets[:, 0] | (triplets[:, 1] << 8) | (triplets[:, 2] << 16)
+        samples = (np.where(packed >= 1 << 23, packed - (1 << 24), packed)).astype(np.float32) / (1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / (1 << 31)
+    else:
+        raise ValueError(f"Unsupported WAV sample width {width}")
+
+    channels = header["channels"]
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+def read_wav_blocks(audio_path, block_seconds=SPLITTER_BLOCK_SECONDS):
+    header = read_wav_header(audio_path)
+    frame_size = header["sample_width"] * header["channels"]
+    block_bytes = max(1, int(block_seconds * header["sample_rate"])) * frame_size
+    data_size = header["data_size"] - header["data_size"] % frame_size
+
+    if data_size <= 0:
+        return
+
+    data = np.memmap(audio_path, dtype=np.uint8, mode="r", offset=header["data_offset"], shape=(data_size,))
+    for start in range(0, data_size, block_bytes):
+        yield decode_frames(data[start:start + block_bytes], header)
+
+class StreamingResampler:
+    def __init__(self, source_rate, target_rate=SAMPLE_RATE):
+        self.source_rate = source_rate
+        self.target_rate = target_rate
+        self.step = source_rate / target_rate
+        self._tail = np.zeros(0, dtype=np.float32)
+        self._position = 0.0
+
+    def process(self, block):
+        if self.source_rate == self.target_rate:
+            return block.astype(SAMPLE_DTYPE)
+
+        buffer = np.concatenate([self._tail, block])
+
+        if self.source_rate % self.target_rate == 0:
+            # Integer decimation (48k, 32k -> 16k): averaging each group of
+            # samples doubles as the anti-aliasing filter.
+            factor = self.source_rate // self.target_rate
+            usable = len(buffer) - len(buffer) % factor
+            self._tail = buffer[usable:]
+            return buffer[:usable].reshape(-1, factor).mean(axis=1).astype(SAMPLE_DTYPE)
 
+        last = len(buffer) - 1
+        if last < self._position:
+            self._tail = buffer
+            return np.zeros(0, dtype=SAMPLE_DTYPE)
+
+        count = int((last - self._position) // self.step) + 1
+        positions = self._position + self.step * np.arange(count)
+        resampled = np.interp(positions, np.arange(len(buffer)), buffer)
+
+        next_position = self._position + self.step * count
+        # With a large step the next sample can lie past this buffer; the
+        # overshoot has to carry over or the output drifts from the source.
+        keep_from = min(int(next_position), len(buffer))
+        self._tail = buffer[keep_from:]
+        self._position = next_position - keep_from
+        return resampled.astype(SAMPLE_DTYPE)
+
+def plan_segments(diarization_data):
     timestamps = []
     for seg in diarization_data:
         timestamps.append(int(seg.get("timestamp_ms", 0)))
     anchor_ms = min(timestamps)
 
-    segments_data = []
-    logger.info(f"Total {len(diarization_data)} segments")
-
+    planned = []
     for i, segment in enumerate(diarization_data):
         try:
             speaker = segment.get("speaker_name", "unknown")
@@ -50,28 +168,180 @@ def consume_diarized_segments(json_path, audio_path):
                 continue
 
             start = max(0, start_time - anchor_ms)
-            end = start + duration_time
-
-            clip = full_audio[start:end].set_frame_rate(16000).set_channels(1)
-            if len(clip) <= 0:
-                continue
-            
-            filename = f"{speaker}_{i}.wav"
-            output_file = os.path.join(output_path, filename)
-
-            clip.export(output_file, format="wav")
-            segments_data.append({
+            planned.append({
                 "index": i,
                 "speaker": speaker,
-                "file_path": output_file,
+                "start_ms": start,
+                "end_ms": start + duration_time,
                 "start": start_time,
                 "end": start_time + duration_time,
                 "duration_ms": duration_time,
                 "text": segment.get("transcription", {}).get("transcript", "")
             })
-            logger.info(f"Extracted {speaker} - {output_file} duration: {len(clip)}ms")
         except Exception as e:
             logger.error(f"Error processing segment {i}: {e}")
 
-    logger.info(f"Finished spliting into {len(segments_data)} audio chunks")
-    return segments_data
+    planned.sort(key=lambda seg: (seg["start_ms"], seg["index"]))
+    return planned
+
+def trim_segment(segment, pcm):
+    audio = pcm.read(segment["offset"], segment["num_samples"])
+
+    bounds = voiced_bounds(audio)
+    if bounds is None:
+        logger.info(f"Dropped silent segment {segment['index']} ({segment['speaker']})")
+        return None
+
+    start, end = bounds
+    return dict(segment, offset=segment["offset"] + start, num_samples=end - start)
+
+def can_merge(group, segment):
+    samples_per_ms = SAMPLE_RATE // 1000
+    span = segment["offset"] + segment["num_samples"] - group["offset"]
+    return (
+        segment["speaker"] == group["speaker"]
+        and segment["start_ms"] - group["end_ms"] <= SEGMENT_MERGE_GAP_MS
+        and span <= SEGMENT_MAX_MS * samples_per_ms
+    )
+
+def merge_segments(group, segment):
+    end_sample = max(group["offset"] + group["num_samples"], segment["offset"] + segment["num_samples"])
+    end_ms = max(group["end_ms"], segment["end_ms"])
+    end = max(group["end"], segment["end"])
+    text = " ".join(t for t in (group["text"], segment["text"]) if t)
+
+    return dict(
+        group,
+        num_samples=end_sample - group["offset"],
+        end_ms=end_ms,
+        end=end,
+        duration_ms=end - group["start"],
+        text=text,
+        indices=group["indices"] + segment["indices"],
+    )
+
+def split_segment(segment, pcm):
+    samples_per_ms = SAMPLE_RATE // 1000
+    max_samples = SEGMENT_MAX_MS * samples_per_ms
+    if segment["num_samples"] <= max_samples:
+        return [segment]
+
+    audio = pcm.read(segment["offset"], segment["num_samples"])
+
+    search = min(SEGMENT_SPLIT_SEARCH_MS * samples_per_ms, max_samples // 2)
+    cuts = [0]
+    while len(audio) - cuts[-1] > max_samples:
+        limit = cuts[-1] + max_samples
+        cuts.append(find_pause(audio, limit - search, limit))
+    cuts.append(len(audio))
+
+    # Pieces are placed on the original timeline relative to where the
+    # diarized segment starts, so every fragment keeps real timestamps.
+    pieces = []
+    for position, (a, b) in enumerate(zip(cuts, cuts[1:])):
+        start_ms = segment["start_ms"] if position == 0 else (segment["offset"] + a) // samples_per_ms
+        end_ms = segment["end_ms"] if b == len(audio) else (segment["offset"] + b) // samples_per_ms
+        start = segment["start"] + start_ms - segment["start_ms"]
+        end = segment["start"] + end_ms - segment["start_ms"]
+        pieces.append(dict(
+            segment,
+            offset=segment["offset"] + a,
+            num_samples=b - a,
+            start_ms=start_ms,
+            end_ms=end_ms,
+            start=start,
+            end=end,
+            duration_ms=end - start,
+        ))
+
+    logger.info(f"Split {segment['duration_ms']}ms segment {segment['index']} into {len(pieces)} pieces")
+    return pieces
+
+def shape_segments(segments, pcm):
+    # Drops silence, coalesces same-speaker runs and cuts long turns at
+    # pauses, so Whisper sees fewer, tighter windows of at most ~30s.
+    group = None
+    for segment in segments:
+        segment = trim_segment(dict(segment, indices=[segment["index"]]), pcm)
+        if segment is None:
+            continue
+
+        if group is not None and can_merge(group, segment):
+            group = merge_segments(group, segment)
+            continue
+
+        if group is not None:
+            yield from split_segment(group, pcm)
+        group = segment
+
+    if group is not None:
+        yield from split_segment(group, pcm)
+
+def audio_blocks(audio_path):
+    # 16kHz mono float32 blocks: WAV is parsed in-process, everything else
+    # is piped through ffmpeg.
+    if not audio_path.lower().endswith(".wav"):
+        yield from stream_audio(audio_path)
+        return
+
+    header = read_wav_header(audio_path)
+    resampler = StreamingResampler(header["sample_rate"])
+    for block in read_wav_blocks(audio_path):
+        yield resampler.process(block)
+
+def decode_segments(pending, audio_path, pcm):
+    samples_per_ms = SAMPLE_RATE // 1000
+
+    next_segment = 0
+
+    def emit(segment):
+        offset = segment["start_ms"] * samples_per_ms
+        num_samples = min(segment["end_ms"] * samples_per_ms, pcm.written) - offset
+        if num_samples <= 0:
+            return None
+        return dict(segment, offset=offset, num_samples=num_samples)
+
+    for resampled in audio_blocks(audio_path):
+        pcm.write(resampled)
+
+        # Segments are released in start order as soon as the PCM covering
+        # them is published, so transcription overlaps with the rest of the
+        # decode.
+        while next_segment < len(pending) and pending[next_segment]["end_ms"] * samples_per_ms <= pcm.published:
+            segment = emit(pending[next_segment])
+            next_segment += 1
+            if segment:
+                yield segment
+
+    pcm.finish()
+    while next_segment < len(pending):
+        segment = emit(pending[next_segment])
+        next_segment += 1
+        if segment:
+            yield segment
+
+def consume_diarized_segments(json_path, audio_path, job_id):
+
+    logger.info(f"Check json path: {json_path}")
+    logger.info(f"Check for audio file: {audio_path}")
+
+    diarization_data = read_file(json_path)
+    if not diarization_data:
+        return
+
+    pending = plan_segments(diarization_data)
+    logger.info(f"Total {len(diarization_data)} segments")
+
+    with open_pcm(job_id) as pcm:
+        segments = decode_segments(pending, audio_path, pcm)
+        if VAD_ENABLED:
+            segments = shape_segments(segments, pcm)
+
+        chunk_index = 0
+        for segment in segments:
+            chunk = dict(segment, chunk_index=chunk_index)
+            logger.info(f"Extracted {chunk['speaker']} - samples {chunk['offset']}:{chunk['offset'] + chunk['num_samples']}")
+            chunk_index += 1
+            yield chunk
+
+    logger.info(f"Finished spliting into {chunk_index} audio chunks")
@@ -0,0 +1,88 @@
+import asyncio
+from fastapi import HTTPException
+from app.config import EVENTS_MAX_STREAMS, EVENTS_KEEPALIVE_SECONDS
+from app.services.redis_service import async_redis_client, job_events_channel, JOBS_DELETED_CHANNEL
+from app.services.results import final_documents
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# One subscription per API process, fanned out to a queue per open event
+# stream, so streams cost no Redis connection of their own. The same
+# subscription drops documents of jobs the retention sweeper deleted.
+
+JOB_EVENTS_PATTERN = job_events_channel("*")
+
+def channel_job_id(channel):
+    prefix, suffix = JOB_EVENTS_PATTERN.split("*")
+    return channel[len(prefix):-len(suffix)]
+
+
+class JobEventHub:
+    def __init__(self, max_streams=EVENTS_MAX_STREAMS):
+        self.max_streams = max_streams
+        self.streams = {}
+        self.open_streams = 0
+        self._task = None
+
+    async def start(self):
+        pubsub = async_redis_client.pubsub()
+        await pubsub.psubscribe(JOB_EVENTS_PATTERN)
+        await pubsub.subscribe(JOBS_DELETED_CHANNEL)
+        self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self, pubsub):
+        try:
+            while True:
+                try:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # The connection is re-established, with its
+                    # subscriptions, on the next read.
+                    logger.error(f"Job event subscription failed: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                if message is not None:
+                    self._dispatch(message)
+        finally:
+            await pubsub.aclose()
+
+    def _dispatch(self, message):
+        if message["type"] == "pmessage":
+            for queue in self.streams.get(channel_job_id(message["channel"]), ()):
+                queue.put_nowait(message["data"])
+        elif message["type"] == "message" and message["channel"] == JOBS_DELETED_CHANNEL:
+            final_documents.discard(message["data"])
+
+    def open(self, job_id):
+        if self.open_streams >= self.max_streams:
+            raise HTTPException(status_code=503, detail="Too many open event streams", headers={"Retry-After": "5"})
+
+        queue = asyncio.Queue()
+        self.streams.setdefault(job_id, set()).add(queue)
+        self.open_streams += 1
+        return queue
+
+    def close(self, job_id, queue):
+        queues = self.streams.get(job_id)
+        if queues is None or queue not in queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.streams[job_id]
+        self.open_streams -= 1
+
+
+job_event_hub = JobEventHub()
@@ -0,0 +1,116 @@
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Histograms live in Redis so every worker process adds to the same series:
+# one hash per series with a count per bucket plus sum and count, and a set
+# listing the series for the /metrics scrape.
+HISTOGRAMS_KEY = "metrics:histograms"
+COUNTERS_KEY = "metrics:counters"
+HISTOGRAM_PREFIX = "metrics:hist:"
+METRIC_PREFIX = "polygraf_"
+
+SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5)
+
+HISTOGRAMS = {
+    "stage_seconds": (SECONDS_BUCKETS, "Time spent per pipeline stage"),
+    "queue_wait_seconds": (SECONDS_BUCKETS, "Time tasks waited in a queue before a worker reserved them"),
+    "transcription_rtf": (RTF_BUCKETS, "ASR seconds per second of audio, per transcribed batch"),
+    "llm_call_seconds": (SECONDS_BUCKETS, "Latency of uncached LLM calls"),
+}
+
+COUNTERS = {
+    "audio_seconds_transcribed": "Seconds of audio transcribed",
+    "asr_seconds": "Seconds spent in ASR",
+    "chunks_transcribed": "Chunks transcribed",
+    "llm_calls": "Uncached LLM calls",
+    "jobs_complete": "Jobs completed",
+    "jobs_failed": "Jobs failed",
+    "jobs_rejected": "Jobs refused by admission control",
+}
+
+def histogram_key(name, **labels):
+    key = HISTOGRAM_PREFIX + name
+    for label, value in sorted(labels.items()):
+        key += f"|{label}={value}"
+    return key
+
+def parse_histogram_key(key):
+    name, *pairs = key[len(HISTOGRAM_PREFIX):].split("|")
+    return name, dict(pair.split("=", 1) for pair in pairs)
+
+def bucket_field(value, buckets):
+    for bound in buckets:
+        if value <= bound:
+            return str(bound)
+    return "+Inf"
+
+def observe(pipe, name, value, **labels):
+    buckets, void = HISTOGRAMS[name]
+    key = histogram_key(name, **labels)
+    pipe.sadd(HISTOGRAMS_KEY, key)
+    pipe.hincrby(key, bucket_field(value, buckets), 1)
+    pipe.hincrbyfloat(key, "sum", value)
+    pipe.hincrby(key, "count", 1)
+
+def count(pipe, name, amount=1):
+    if isinstance(amount, float):
+        pipe.hincrbyfloat(COUNTERS_KEY, name, amount)
+    else:
+        pipe.hincrby(COUNTERS_KEY, name, amount)
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{label}="{value}"' for label, value in sorted(labels.items()))
+    return "{" + pairs + "}"
+
+def render_metrics(histograms, counters, queue_depths, cache_stats):
+    # Prometheus text exposition format, version 0.0.4.
+    lines = []
+
+    series = {}
+    for key, values in histograms.items():
+        name, labels = parse_histogram_key(key)
+        if name in HISTOGRAMS:
+            series.setdefault(name, []).append((labels, values))
+
+    for name, (buckets, help_text) in HISTOGRAMS.items():
+        metric = METRIC_PREFIX + name
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+
+        for labels, values in sorted(series.get(name, []), key=lambda item: sorted(item[0].items())):
+            cumulative = 0
+            for bound in buckets:
+                cumulative += int(values.get(str(bound), 0))
+                lines.append(f"{metric}_bucket{format_labels({**labels, 'le': bound})} {cumulative}")
+            cumulative += int(values.get("+Inf", 0))
+            lines.append(f"{metric}_bucket{format_labels({**labels, 'le': '+Inf'})} {cumulative}")
+            lines.append(f"{metric}_sum{format_labels(labels)} {float(values.get('sum', 0))}")
+            lines.append(f"{metric}_count{format_labels(labels)} {int(values.get('count', 0))}")
+
+    for name, help_text in COUNTERS.items():
+        metric = f"{METRIC_PREFIX}{name}_total"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {float(counters.get(name, 0))}")
+
+    metric = METRIC_PREFIX + "queue_depth"
+    lines.append(f"# HELP {metric} Tasks per queue and state")
+    lines.append(f"# TYPE {metric} gauge")
+    for queue_name, states in sorted(queue_depths.items()):
+        for state, depth in sorted(states.items()):
+            lines.append(f"{metric}{format_labels({'queue': queue_name, 'state': state})} {depth}")
+
+    for kind in ("hits", "misses"):
+        metric = f"{METRIC_PREFIX}cache_{kind}_total"
+        lines.append(f"# HELP {metric} Result cache {kind}")
+        lines.append(f"# TYPE {metric} counter")
+        for field, value in sorted(cache_stats.items()):
+            namespace, void, stat = field.rpartition(":")
+            if stat == kind:
+                lines.append(f"{metric}{format_labels({'namespace': namespace})} {int(value)}")
+
+    return "\n".join(lines) + "\n"
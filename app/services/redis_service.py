@@ -1,20 +1,368 @@
 import json
+import time
+import uuid
 import redis
-from app.config import REDIS_HOST, REDIS_PORT, REDIS_DB
+import redis.asyncio
+from app.config import (
+    REDIS_HOST,
+    REDIS_PORT,
+    REDIS_DB,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_POOL_TIMEOUT,
+    SUMMARY_INCREMENTAL_CHUNKS,
+    QUEUE_VISIBILITY_TIMEOUT,
+    QUEUE_MAX_DELIVERIES,
+    QUEUE_REAP_INTERVAL,
+    FAIR_SHARE_QUEUES,
+    JOB_DEFAULT_PRIORITY,
+    RETENTION_MEDIA_SECONDS,
+    RETENTION_JOB_SECONDS,
+    RETENTION_UPLOAD_SECONDS,
+    ADMISSION_SEGMENT_SECONDS,
+    ADMISSION_THROUGHPUT_WINDOW,
+)
+from app.services.metrics import observe, count, HISTOGRAMS_KEY, COUNTERS_KEY
+from app.services.chunk_store import SAMPLE_RATE
+from app.services.transcripts import (
+    speakers_key,
+    transcript_key,
+    pack_transcript,
+    transcript_score,
+    score_range,
+    legacy_transcripts_key,
+    unpack_legacy_transcripts,
+    merge_transcripts,
+)
 from app.logger import get_logger
 
 logger = get_logger(__name__)
 
 logger.info("Inside app.services.redis_service")
 
+# Moves tasks whose lease has expired back onto the queue, or onto the dead
+# letter list once they have been delivered too often. Tasks sitting in the
+# processing list without a lease (the worker died between BLMOVE and the
+# lease write) get one starting now. On fair-share queues (job_prefix set)
+# tasks go back to the front of their job's sub-queue.
+REQUEUE_EXPIRED_SCRIPT = """
+local queue, processing, leases, deliveries, dead = KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5]
+local active, weights, clock, wakeup = KEYS[6], KEYS[7], KEYS[8], KEYS[9]
+local now, max_deliveries, new_deadline, job_prefix = ARGV[1], tonumber(ARGV[2]), ARGV[3], ARGV[4]
+
+local function requeue(raw)
+    if job_prefix ~= '' then
+        local ok, task = pcall(cjson.decode, raw)
+        if ok and type(task) == 'table' and task.job_id then
+            redis.call('LPUSH', job_prefix .. task.job_id, raw)
+            redis.call('HSETNX', weights, task.job_id, task.priority or 1)
+            redis.call('ZADD', active, 'NX', redis.call('GET', clock) or 0, task.job_id)
+            redis.call('LPUSH', wakeup, 1)
+            return
+        end
+    end
+    redis.call('LPUSH', queue, raw)
+end
+
+local dead_tasks = {}
+local expired = redis.call('ZRANGEBYSCORE', leases, '-inf', now, 'LIMIT', 0, 100)
+for _, raw in ipairs(expired) do
+    redis.call('ZREM', leases, raw)
+    if redis.call('LREM', processing, 1, raw) > 0 then
+        local count = tonumber(redis.call('HGET', deliveries, raw) or '0')
+        if count >= max_deliveries then
+            redis.call('HDEL', deliveries, raw)
+            redis.call('RPUSH', dead, raw)
+            table.insert(dead_tasks, raw)
+        else
+            requeue(raw)
+        end
+    end
+end
+
+for _, raw in ipairs(redis.call('LRANGE', processing, 0, -1)) do
+    if not redis.call('ZSCORE', leases, raw) then
+        redis.call('ZADD', leases, new_deadline, raw)
+    end
+end
+
+return dead_tasks
+"""
+
+# Appends one job's tasks to its sub-queue of a fair-share queue. A job that
+# was not waiting joins at the current virtual time, so it neither jumps
+# ahead of nor falls behind the jobs already queued. Each task leaves a
+# wake-up token for blocked workers.
+FAIR_ENQUEUE_SCRIPT = """
+local job_queue, active, weights, clock, wakeup = KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5]
+local job_id, weight = ARGV[1], ARGV[2]
+
+for i = 3, #ARGV do
+    redis.call('RPUSH', job_queue, ARGV[i])
+    redis.call('LPUSH', wakeup, 1)
+end
+redis.call('LTRIM', wakeup, 0, 255)
+redis.call('HSET', weights, job_id, weight)
+redis.call('ZADD', active, 'NX', redis.call('GET', clock) or 0, job_id)
+return redis.call('LLEN', job_queue)
+"""
+
+# Stride scheduling over the jobs waiting in a fair-share queue: the job
+# with the lowest pass gets the next task and its pass advances by
+# 1 / weight, so a priority 4 job is served four times as often as a
+# priority 1 job and none can starve another. Tasks pushed onto the plain
+# list (older producers) are served after the sub-queues.
+FAIR_DISPATCH_SCRIPT = """
+local active, weights, clock, processing, queue = KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5]
+local job_prefix, count = ARGV[1], tonumber(ARGV[2])
+
+local raws = {}
+while #raws < count do
+    local head = redis.call('ZRANGE', active, 0, 0, 'WITHSCORES')
+    if #head == 0 then
+        break
+    end
+
+    local job_id, pass = head[1], tonumber(head[2])
+    local job_queue = job_prefix .. job_id
+    local raw = redis.call('LPOP', job_queue)
+    if raw then
+        redis.call('RPUSH', processing, raw)
+        table.insert(raws, raw)
+        redis.call('SET', clock, pass)
+        pass = pass + 1 / tonumber(redis.call('HGET', weights, job_id) or '1')
+    end
+
+    if redis.call('LLEN', job_queue) == 0 then
+        redis.call('ZREM', active, job_id)
+        redis.call('HDEL', weights, job_id)
+    else
+        redis.call('ZADD', active, pass, job_id)
+    end
+end
+
+while #raws < count do
+    local raw = redis.call('LMOVE', queue, processing, 'LEFT', 'RIGHT')
+    if not raw then
+        break
+    end
+    table.insert(raws, raw)
+end
+return raws
+"""
+
+# Records one finished chunk and decides, exactly once, whether it was the
+# last one. A chunk index already in the done set (a redelivered task) is
+# not counted twice. done_prefix tracks how many chunks from index 0 are
+# finished without gaps; when incremental summaries are on, every
+# incremental_chunks of new prefix queue a partial summary task.
+COMPLETE_CHUNK_SCRIPT = """
+local job, transcripts, done, summary_queue, speakers = KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5]
+local chunk_index, chunk_data, summary_task = ARGV[1], ARGV[2], ARGV[3]
+local incremental_chunks, partial_task, events = tonumber(ARGV[4]), ARGV[5], ARGV[6]
+local timestamp_ms, speaker = ARGV[7], ARGV[8]
+
+if chunk_index ~= '' and redis.call('SADD', done, chunk_index) == 0 then
+    return {tonumber(redis.call('HGET', job, 'processed_chunks') or '0'), 0}
+end
+
+redis.call('ZADD', transcripts, timestamp_ms, chunk_data)
+redis.call('SADD', speakers, speaker)
+local processed = redis.call('HINCRBY', job, 'processed_chunks', 1)
+local total = tonumber(redis.call('HGET', job, 'total_chunks') or '0')
+redis.call('PUBLISH', events, cjson.encode({status = 'transcribing', processed_chunks = processed, total_chunks = total}))
+
+if total > 0 and processed >= total and redis.call('HSETNX', job, 'summary_queued', 1) == 1 then
+    redis.call('HSET', job, 'status', 'summarizing')
+    redis.call('RPUSH', summary_queue, summary_task)
+    redis.call('PUBLISH', events, cjson.encode({status = 'summarizing'}))
+    return {processed, 1}
+end
+
+if incremental_chunks > 0 and chunk_index ~= '' then
+    local prefix = tonumber(redis.call('HGET', job, 'done_prefix') or '0')
+    while redis.call('SISMEMBER', done, tostring(prefix)) == 1 do
+        prefix = prefix + 1
+    end
+    redis.call('HSET', job, 'done_prefix', prefix)
+
+    local requested = tonumber(redis.call('HGET', job, 'partial_requested') or '0')
+    if prefix - requested >= incremental_chunks and redis.call('HEXISTS', job, 'summary_queued') == 0 then
+        redis.call('HSET', job, 'partial_requested', prefix)
+        redis.call('RPUSH', summary_queue, partial_task)
+        return {processed, 2}
+    end
+end
+return {processed, 0}
+"""
+
+# Publishes the chunk total once the splitter is done. Transcription runs
+# while the split streams, so every chunk may already be finished.
+SET_TOTAL_CHUNKS_SCRIPT = """
+local job, summary_queue = KEYS[1], KEYS[2]
+local total, summary_task, events = tonumber(ARGV[1]), ARGV[2], ARGV[3]
+
+redis.call('HSET', job, 'total_chunks', total)
+if redis.call('HEXISTS', job, 'summary_queued') == 1 then
+    return 0
+end
+redis.call('HSET', job, 'status', 'transcribing')
+
+local processed = tonumber(redis.call('HGET', job, 'processed_chunks') or '0')
+redis.call('PUBLISH', events, cjson.encode({status = 'transcribing', processed_chunks = processed, total_chunks = total}))
+
+if total > 0 and processed >= total and redis.call('HSETNX', job, 'summary_queued', 1) == 1 then
+    redis.call('HSET', job, 'status', 'summarizing')
+    redis.call('RPUSH', summary_queue, summary_task)
+    redis.call('PUBLISH', events, cjson.encode({status = 'summarizing'}))
+    return 1
+end
+return 0
+"""
+
+# Locks taken with a token are only renewed or released by their holder, so a
+# holder whose lock expired can't extend or drop its successor's.
+EXTEND_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Admits a job if the outstanding work of admitted jobs, plus its own, fits
+# the capacity, and records its cost. An idle cluster admits any job, so a
+# recording bigger than the whole capacity still runs eventually.
+ADMIT_JOB_SCRIPT = """
+local admitted = KEYS[1]
+local job_id, cost, capacity, max_jobs = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+
+local backlog, jobs = 0, 0
+local values = redis.call('HVALS', admitted)
+for _, value in ipairs(values) do
+    value = tonumber(value)
+    if value > 0 then
+        backlog = backlog + value
+        jobs = jobs + 1
+    end
+end
+
+if jobs > 0 and ((capacity > 0 and backlog + cost > capacity) or (max_jobs > 0 and jobs >= max_jobs)) then
+    return {0, tostring(backlog), jobs}
+end
+redis.call('HSET', admitted, job_id, cost)
+return {1, tostring(backlog), jobs}
+"""
+
+
+# Jobs by the time their media (retention:media) and everything else
+# (retention:jobs) may be deleted. Deleted job ids are announced on
+# JOBS_DELETED_CHANNEL so API processes drop cached documents.
+RETENTION_MEDIA_KEY = "retention:media"
+RETENTION_JOBS_KEY = "retention:jobs"
+RETENTION_BACKFILL_KEY = "retention:backfill_cursor"
+JOBS_DELETED_CHANNEL = "jobs:deleted"
+
+# Remaining estimated work (seconds of audio) of each admitted job, worked
+# down as chunks are transcribed and dropped when the job finishes, and the
+# audio transcribed per minute, for admission control.
+ADMISSION_KEY = "admission:jobs"
+ADMISSION_ORPHANS_KEY = "admission:orphans"
+THROUGHPUT_PREFIX = "admission:throughput:"
+
+def throughput_key(minute):
+    return f"{THROUGHPUT_PREFIX}{minute}"
+
+def job_events_channel(job_id):
+    return f"job:{job_id}:events"
+
+def job_keys(job_id, speakers):
+    keys = [
+        f"job:{job_id}",
+        f"job:{job_id}:done_chunks",
+        f"job:{job_id}:partials",
+        f"job:{job_id}:final",
+        legacy_transcripts_key(job_id),
+        speakers_key(job_id),
+    ]
+    return keys + [transcript_key(job_id, speaker) for speaker in speakers]
+
+def create_job(pipe, job_id, priority):
+    now = time.time()
+    pipe.hset(f"job:{job_id}", mapping={
+        "status": "queued",
+        "created_at": now,
+        "total_chunks": 0,
+        "processed_chunks": 0,
+        "priority": priority,
+    })
+    pipe.publish(job_events_channel(job_id), json.dumps({"status": "queued"}))
+
+    # A job that never finishes is still removed RETENTION_JOB_SECONDS
+    # after it was created.
+    if RETENTION_JOB_SECONDS > 0:
+        pipe.zadd(RETENTION_MEDIA_KEY, {job_id: now + RETENTION_JOB_SECONDS})
+        pipe.zadd(RETENTION_JOBS_KEY, {job_id: now + RETENTION_JOB_SECONDS})
+
+def retain_finished_job(job_id, pipe):
+    now = time.time()
+    pipe.hset(f"job:{job_id}", "finished_at", now)
+    if RETENTION_MEDIA_SECONDS > 0:
+        pipe.zadd(RETENTION_MEDIA_KEY, {job_id: now + RETENTION_MEDIA_SECONDS})
+    else:
+        pipe.zrem(RETENTION_MEDIA_KEY, job_id)
+    if RETENTION_JOB_SECONDS > 0:
+        pipe.zadd(RETENTION_JOBS_KEY, {job_id: now + RETENTION_JOB_SECONDS})
+
+def task_body(payload):
+    payload = {"task_id": uuid.uuid4().hex, "enqueued_at": time.time(), **payload}
+    return json.dumps(payload)
+
+def job_queue_key(queue_name, job_id):
+    return f"{queue_name}:job:{job_id}"
+
+def fair_share_keys(queue_name):
+    return [f"{queue_name}:active", f"{queue_name}:weights", f"{queue_name}:clock", f"{queue_name}:wakeup"]
+
 
 class RedisService:
     def __init__(self):
         host, redis_port,db, decode_responses = REDIS_HOST, REDIS_PORT, REDIS_DB, True
-        self.client = redis.Redis(host=host, port=redis_port, db=db, decode_responses=decode_responses)
+        # Nothing connects until the first command, so importing this module
+        # never needs a live server.
+        self.client = redis.Redis(
+            host=host,
+            port=redis_port,
+            db=db,
+            decode_responses=decode_responses,
+            max_connections=REDIS_MAX_CONNECTIONS,
+        )
+        # Transcript records are msgpack, which must not be decoded as text.
+        self.binary_client = redis.Redis(
+            host=host,
+            port=redis_port,
+            db=db,
+            decode_responses=False,
+            max_connections=REDIS_MAX_CONNECTIONS,
+        )
 
-        self.client.ping()
+        self._requeue_expired = self.client.register_script(REQUEUE_EXPIRED_SCRIPT)
+        self._complete_chunk = self.client.register_script(COMPLETE_CHUNK_SCRIPT)
+        self._set_total_chunks = self.client.register_script(SET_TOTAL_CHUNKS_SCRIPT)
+        self._fair_enqueue = self.client.register_script(FAIR_ENQUEUE_SCRIPT)
+        self._fair_dispatch = self.client.register_script(FAIR_DISPATCH_SCRIPT)
+        self._extend_lock = self.client.register_script(EXTEND_LOCK_SCRIPT)
+        self._release_lock = self.client.register_script(RELEASE_LOCK_SCRIPT)
+        self._last_reap = {}
+        self._dead_letter_handlers = {}
 
+    def connect(self):
+        self.client.ping()
         logger.info(f"Redis connection successful {REDIS_HOST}:{REDIS_PORT}")
     
     def get_job_status(self, job_id):
@@ -25,21 +373,73 @@ class RedisService:
     def increment_processed_count(self, job_id):
         key_repr = f"job:{job_id}"
         incr_val = self.client.hincrby(key_repr, "processed_chunks", 1)
+        self.publishJobEvent(job_id, {"status": "transcribing", "processed_chunks": incr_val})
         return incr_val
 
-    def jobCreation(self, job_id):
-        job_key = f"Job:{job_id}"
-        self.client.hset(job_key, mapping={
-            "status": "queued",
-            "createdAt": "now",
-            "total_chunks": 0,
-            "processed_chunks": 0,
-        })
+    def publishJobEvent(self, job_id, event):
+        self.client.publish(job_events_channel(job_id), json.dumps(event))
+
+    def jobCreation(self, job_id, priority=JOB_DEFAULT_PRIORITY):
+        pipe = self.client.pipeline(transaction=False)
+        create_job(pipe, job_id, priority)
+        pipe.execute()
+
+    def uploadCreation(self, upload_id, **meta):
+        upload_key = f"upload:{upload_id}"
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(upload_key, mapping=meta)
+        if RETENTION_UPLOAD_SECONDS > 0:
+            pipe.expire(upload_key, RETENTION_UPLOAD_SECONDS)
+        pipe.execute()
+
+    def get_upload(self, upload_id):
+        upload_key = f"upload:{upload_id}"
+        return self.client.hgetall(upload_key)
+
+    def deleteUpload(self, upload_id):
+        upload_key = f"upload:{upload_id}"
+        self.client.delete(upload_key)
 
-    def pushIntoQueue(self, queue_name, payload):
-        body = json.dumps(payload)
+    def acquireLock(self, name, ttl_seconds, token=1):
+        return bool(self.client.set(f"lock:{name}", token, nx=True, ex=ttl_seconds))
+
+    def extendLock(self, name, ttl_seconds, token):
+        return bool(self._extend_lock(keys=[f"lock:{name}"], args=[token, int(ttl_seconds)]))
+
+    def releaseLock(self, name, token=None):
+        if token is None:
+            self.client.delete(f"lock:{name}")
+        else:
+            self._release_lock(keys=[f"lock:{name}"], args=[token])
+
+    def pushIntoQueue(self, queue_name, payload, priority=None):
+        if queue_name in FAIR_SHARE_QUEUES:
+            self.pushManyIntoQueue(queue_name, [payload], priority)
+            return
+        body = task_body(payload)
         self.client.rpush(queue_name, body)
 
+    def pushManyIntoQueue(self, queue_name, payloads, priority=None):
+        if not payloads:
+            return
+
+        if queue_name not in FAIR_SHARE_QUEUES:
+            bodies = [task_body(payload) for payload in payloads]
+            self.client.rpush(queue_name, *bodies)
+            return
+
+        priority = int(priority or JOB_DEFAULT_PRIORITY)
+        by_job = {}
+        for payload in payloads:
+            body = task_body({**payload, "priority": priority})
+            by_job.setdefault(payload["job_id"], []).append(body)
+
+        pipe = self.client.pipeline(transaction=False)
+        for job_id, bodies in by_job.items():
+            keys = [job_queue_key(queue_name, job_id)] + fair_share_keys(queue_name)
+            self._fair_enqueue(keys=keys, args=[job_id, priority, *bodies], client=pipe)
+        pipe.execute()
+
     def statusUpdate(self, job_id, status, **extra):
         data = {
             "status": status
@@ -47,7 +447,135 @@ class RedisService:
         data.update(extra)
 
         job_key = f"job:{job_id}"
-        self.client.hset(job_key, mapping=data)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(job_key, mapping=data)
+        pipe.publish(job_events_channel(job_id), json.dumps(data))
+        if status in ("complete", "failed"):
+            count(pipe, f"jobs_{status}")
+            retain_finished_job(job_id, pipe)
+            pipe.hdel(ADMISSION_KEY, job_id)
+        pipe.execute()
+
+    def dueForRetention(self, key, now, limit):
+        return self.client.zrangebyscore(key, "-inf", now, start=0, num=limit)
+
+    def clearMediaRetention(self, job_id):
+        self.client.zrem(RETENTION_MEDIA_KEY, job_id)
+
+    def deleteJob(self, job_id):
+        speakers = self.client.smembers(speakers_key(job_id))
+
+        pipe = self.client.pipeline(transaction=False)
+        pipe.delete(*job_keys(job_id, speakers))
+        pipe.zrem(RETENTION_MEDIA_KEY, job_id)
+        pipe.zrem(RETENTION_JOBS_KEY, job_id)
+        pipe.hdel(ADMISSION_KEY, job_id)
+        pipe.publish(JOBS_DELETED_CHANNEL, job_id)
+        pipe.execute()
+
+    def releaseStaleAdmissions(self, now, stale_seconds):
+        # Admissions with no job hash are tracked by when the sweeper first saw
+        # them; a job that is still missing stale_seconds later was never
+        # enqueued. Returns the released job ids.
+        job_ids = self.client.hkeys(ADMISSION_KEY)
+        first_seen = dict(self.client.zrange(ADMISSION_ORPHANS_KEY, 0, -1, withscores=True))
+
+        pipe = self.client.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.exists(f"job:{job_id}")
+        missing = [job_id for job_id, exists in zip(job_ids, pipe.execute()) if not exists]
+
+        released = []
+        pipe = self.client.pipeline(transaction=False)
+        for job_id in missing:
+            seen_at = first_seen.pop(job_id, None)
+            if seen_at is None:
+                pipe.zadd(ADMISSION_ORPHANS_KEY, {job_id: now})
+            elif now - seen_at >= stale_seconds:
+                pipe.hdel(ADMISSION_KEY, job_id)
+                pipe.zrem(ADMISSION_ORPHANS_KEY, job_id)
+                released.append(job_id)
+        # Enqueued or finished since they were seen.
+        if first_seen:
+            pipe.zrem(ADMISSION_ORPHANS_KEY, *first_seen)
+        pipe.execute()
+        return released
+
+    def backfillRetention(self, count=1000):
+        # Walks the keyspace once, a slice per call: jobs created before
+        # retention existed get a deadline, and the unused Job:<id> hashes
+        # older versions wrote are deleted. Returns False once done.
+        cursor = self.client.get(RETENTION_BACKFILL_KEY)
+        if cursor == "done":
+            return False
+
+        cursor, keys = self.client.scan(int(cursor or 0), match="[Jj]ob:*", count=count)
+        deadline = time.time() + RETENTION_JOB_SECONDS
+
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            prefix, void, rest = key.partition(":")
+            if ":" in rest:
+                continue
+            if prefix == "Job":
+                pipe.delete(key)
+            elif RETENTION_JOB_SECONDS > 0:
+                pipe.zadd(RETENTION_JOBS_KEY, {rest: deadline}, nx=True)
+        pipe.set(RETENTION_BACKFILL_KEY, cursor or "done")
+        pipe.execute()
+        return True
+
+    def recordStages(self, job_id, stages, **fields):
+        # Stage durations add up on the job (a stage can run more than once,
+        # e.g. partial summaries) and feed the shared stage histogram.
+        job_key = f"job:{job_id}"
+        pipe = self.client.pipeline(transaction=False)
+        for stage, seconds in stages.items():
+            pipe.hincrbyfloat(job_key, f"{stage}_seconds", round(seconds, 3))
+            observe(pipe, "stage_seconds", seconds, stage=stage)
+        if fields:
+            pipe.hset(job_key, mapping=fields)
+        pipe.execute()
+
+    def recordTranscription(self, tasks, elapsed, transcribed=None):
+        # A batch can mix jobs, so its ASR time is shared out by audio length.
+        audio = {}
+        chunks = {}
+        for task in tasks:
+            audio[task["job_id"]] = audio.get(task["job_id"], 0) + task["num_samples"] / SAMPLE_RATE
+            chunks[task["job_id"]] = chunks.get(task["job_id"], 0) + 1
+        total_audio = sum(audio.values())
+        if total_audio <= 0:
+            return
+
+        # Throughput only counts chunks that went through ASR; cache hits
+        # would overstate what the workers can do.
+        if transcribed is None:
+            transcribed = tasks
+        asr_audio = sum(task["num_samples"] for task in transcribed) / SAMPLE_RATE
+        work = asr_audio + len(transcribed) * ADMISSION_SEGMENT_SECONDS
+        minute_key = throughput_key(int(time.time() // 60))
+
+        pipe = self.client.pipeline(transaction=False)
+        for job_id, audio_seconds in audio.items():
+            pipe.hincrbyfloat(f"job:{job_id}", "transcription_seconds", round(elapsed * audio_seconds / total_audio, 3))
+            pipe.hincrbyfloat(f"job:{job_id}", "transcribed_audio_seconds", round(audio_seconds, 3))
+            pipe.hincrbyfloat(ADMISSION_KEY, job_id, -round(audio_seconds + chunks[job_id] * ADMISSION_SEGMENT_SECONDS, 3))
+        if work > 0:
+            pipe.incrbyfloat(minute_key, round(work, 3))
+            pipe.expire(minute_key, ADMISSION_THROUGHPUT_WINDOW + 120)
+        observe(pipe, "transcription_rtf", elapsed / total_audio)
+        observe(pipe, "stage_seconds", elapsed, stage="transcription")
+        count(pipe, "audio_seconds_transcribed", float(total_audio))
+        count(pipe, "asr_seconds", float(elapsed))
+        count(pipe, "chunks_transcribed", len(tasks))
+        pipe.execute()
+
+    def recordLlmCall(self, seconds):
+        pipe = self.client.pipeline(transaction=False)
+        observe(pipe, "llm_call_seconds", seconds)
+        count(pipe, "llm_calls")
+        pipe.execute()
 
     def removeFromQueue(self, queue_name, timeout=0):
         item = self.client.blpop(queue_name, timeout=timeout)
@@ -58,21 +586,233 @@ class RedisService:
             void, value = item
             return json.loads(value)
 
+    def onDeadLetter(self, queue_name, handler):
+        self._dead_letter_handlers[queue_name] = handler
+
+    def _lease(self, queue_name, raws, visibility_timeout):
+        now = time.time()
+        deadline = now + visibility_timeout
+
+        tasks = []
+        pipe = self.client.pipeline(transaction=False)
+        for raw in raws:
+            pipe.zadd(f"{queue_name}:leases", {raw: deadline})
+            pipe.hincrby(f"{queue_name}:deliveries", raw, 1)
+
+            task = json.loads(raw)
+            task["_receipt"] = raw
+            tasks.append(task)
+
+            if "enqueued_at" not in task:
+                continue
+            wait = max(0.0, now - task["enqueued_at"])
+            observe(pipe, "queue_wait_seconds", wait, queue=queue_name)
+
+            # Per-job time spent waiting in a fair-share queue, averaged on read.
+            if queue_name in FAIR_SHARE_QUEUES and "job_id" in task:
+                pipe.hincrby(f"job:{task['job_id']}", "queue_wait_ms", int(wait * 1000))
+                pipe.hincrby(f"job:{task['job_id']}", "queue_dispatched", 1)
+        pipe.execute()
+
+        return tasks
+
+    def _dispatch(self, queue_name, count):
+        active, weights, clock, wakeup = fair_share_keys(queue_name)
+        keys = [active, weights, clock, f"{queue_name}:processing", queue_name]
+        return self._fair_dispatch(keys=keys, args=[job_queue_key(queue_name, ""), count])
+
+    def requeueExpired(self, queue_name, force=False):
+        now = time.time()
+        if not force and now - self._last_reap.get(queue_name, 0) < QUEUE_REAP_INTERVAL:
+            return []
+        self._last_reap[queue_name] = now
+
+        keys = [
+            queue_name,
+            f"{queue_name}:processing",
+            f"{queue_name}:leases",
+            f"{queue_name}:deliveries",
+            f"{queue_name}:dead",
+        ] + fair_share_keys(queue_name)
+        job_prefix = job_queue_key(queue_name, "") if queue_name in FAIR_SHARE_QUEUES else ""
+        args = [now, QUEUE_MAX_DELIVERIES, now + QUEUE_VISIBILITY_TIMEOUT, job_prefix]
+        dead_raws = self._requeue_expired(keys=keys, args=args)
+
+        dead_tasks = [json.loads(raw) for raw in dead_raws]
+        handler = self._dead_letter_handlers.get(queue_name)
+        for task in dead_tasks:
+            logger.error(f"Task dead-lettered from {queue_name}: {task}")
+            if handler:
+                try:
+                    handler(task)
+                except Exception as e:
+                    logger.exception(f"Dead letter handler for {queue_name} failed: {e}")
+
+        return dead_tasks
+
+    def reserveFromQueue(self, queue_name, timeout=0, visibility_timeout=QUEUE_VISIBILITY_TIMEOUT):
+        # Blocks in slices of QUEUE_REAP_INTERVAL so idle workers still
+        # redeliver tasks abandoned by crashed ones.
+        deadline = time.monotonic() + timeout if timeout else None
+
+        while True:
+            self.requeueExpired(queue_name)
+
+            wait = QUEUE_REAP_INTERVAL
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return None
+
+            if queue_name in FAIR_SHARE_QUEUES:
+                raws = self._dispatch(queue_name, 1)
+                if raws:
+                    return self._lease(queue_name, raws, visibility_timeout)[0]
+                # Tokens may outnumber tasks; an empty dispatch just waits again.
+                self.client.blpop(f"{queue_name}:wakeup", wait)
+                continue
+
+            raw = self.client.blmove(queue_name, f"{queue_name}:processing", wait, "LEFT", "RIGHT")
+            if raw:
+                return self._lease(queue_name, [raw], visibility_timeout)[0]
+
+    def reserveManyFromQueue(self, queue_name, max_items, wait_ms=0, timeout=0,
+                             visibility_timeout=QUEUE_VISIBILITY_TIMEOUT):
+        first = self.reserveFromQueue(queue_name, timeout=timeout, visibility_timeout=visibility_timeout)
+        if not first:
+            return []
+
+        tasks = [first]
+        deadline = time.monotonic() + wait_ms / 1000
+        processing = f"{queue_name}:processing"
+
+        if queue_name in FAIR_SHARE_QUEUES:
+            while len(tasks) < max_items:
+                raws = self._dispatch(queue_name, max_items - len(tasks))
+                if raws:
+                    tasks.extend(self._lease(queue_name, raws, visibility_timeout))
+                    continue
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.client.blpop(f"{queue_name}:wakeup", remaining):
+                    break
+            return tasks
+
+        while len(tasks) < max_items:
+            pipe = self.client.pipeline(transaction=False)
+            for void in range(max_items - len(tasks)):
+                pipe.lmove(queue_name, processing, "LEFT", "RIGHT")
+            raws = [raw for raw in pipe.execute() if raw]
+            if raws:
+                tasks.extend(self._lease(queue_name, raws, visibility_timeout))
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            raw = self.client.blmove(queue_name, processing, remaining, "LEFT", "RIGHT")
+            if not raw:
+                break
+            tasks.extend(self._lease(queue_name, [raw], visibility_timeout))
+
+        return tasks
+
+    def extendLease(self, queue_name, task, visibility_timeout=QUEUE_VISIBILITY_TIMEOUT):
+        deadline = time.time() + visibility_timeout
+        self.client.zadd(f"{queue_name}:leases", {task["_receipt"]: deadline}, xx=True)
+
+    def ackTasks(self, queue_name, tasks):
+        pipe = self.client.pipeline(transaction=False)
+        for task in tasks:
+            raw = task["_receipt"]
+            pipe.lrem(f"{queue_name}:processing", 1, raw)
+            pipe.zrem(f"{queue_name}:leases", raw)
+            pipe.hdel(f"{queue_name}:deliveries", raw)
+        pipe.execute()
+
+    def ackTask(self, queue_name, task):
+        self.ackTasks(queue_name, [task])
+
     def saveTranscriptsFromChunks(self, job_id, chunk_data):
-        body = json.dumps(chunk_data)
-        # logger.info(f"In saveTranscriptsFromChunks {body}")
-        job_transcripts_key = f"job:{job_id}:transcripts"
-        self.client.rpush(job_transcripts_key, body)
+        speaker = chunk_data["speaker"]
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zadd(transcript_key(job_id, speaker), {pack_transcript(chunk_data): transcript_score(chunk_data)})
+        pipe.sadd(speakers_key(job_id), speaker)
+        pipe.execute()
+
+    def completeChunks(self, results):
+        pipe = self.client.pipeline(transaction=False)
+        for job_id, chunk_index, chunk_data in results:
+            keys = [
+                f"job:{job_id}",
+                transcript_key(job_id, chunk_data["speaker"]),
+                f"job:{job_id}:done_chunks",
+                "queue:summary",
+                speakers_key(job_id),
+            ]
+            args = [
+                "" if chunk_index is None else chunk_index,
+                pack_transcript(chunk_data),
+                task_body({"job_id": job_id}),
+                SUMMARY_INCREMENTAL_CHUNKS,
+                task_body({"job_id": job_id, "mode": "partial"}),
+                job_events_channel(job_id),
+                transcript_score(chunk_data),
+                chunk_data["speaker"],
+            ]
+            self._complete_chunk(keys=keys, args=args, client=pipe)
+        replies = pipe.execute()
+
+        completed = []
+        for (job_id, void, void), (processed, queued) in zip(results, replies):
+            completed.append((job_id, processed, queued == 1))
+        return completed
+
+    def setTotalChunks(self, job_id, total_chunks):
+        keys = [f"job:{job_id}", "queue:summary"]
+        args = [total_chunks, task_body({"job_id": job_id}), job_events_channel(job_id)]
+        return bool(self._set_total_chunks(keys=keys, args=args))
 
-    def getTranscripts(self, job_id):
-        job_transcripts_key = f"job:{job_id}:transcripts"
-        items = self.client.lrange(job_transcripts_key, 0, -1)
+    def getSpeakers(self, job_id):
+        return sorted(self.client.smembers(speakers_key(job_id)))
 
-        res = []
-        for item in items:
-            res.append(json.loads(item))
-        
-        return res
+    def getTranscripts(self, job_id, start_ms=None, end_ms=None, speakers=None):
+        # Chronological; start_ms/end_ms select a window of timestamp_ms and
+        # speakers limits the read to those speakers' sets.
+        wanted = speakers
+        if speakers is None:
+            speakers = self.getSpeakers(job_id)
+        low, high = score_range(start_ms, end_ms)
+
+        pipe = self.binary_client.pipeline(transaction=False)
+        pipe.lrange(legacy_transcripts_key(job_id), 0, -1)
+        for speaker in speakers:
+            pipe.zrangebyscore(transcript_key(job_id, speaker), low, high)
+        legacy, *replies = pipe.execute()
+
+        legacy = unpack_legacy_transcripts(legacy, start_ms, end_ms, wanted)
+        return merge_transcripts(speakers, replies, legacy)
+
+    def savePartialSummary(self, job_id, partial, summarized_chunks, running_summary):
+        job_key = f"job:{job_id}"
+        pipe = self.client.pipeline()
+        pipe.rpush(f"job:{job_id}:partials", json.dumps(partial))
+        pipe.hset(job_key, mapping={
+            "summarized_chunks": summarized_chunks,
+            "partial_summary": json.dumps(running_summary),
+        })
+        pipe.execute()
+
+    def getPartialSummaries(self, job_id):
+        items = self.client.lrange(f"job:{job_id}:partials", 0, -1)
+        return [json.loads(item) for item in items]
+
+    def saveFinalResult(self, job_id, body):
+        self.client.set(f"job:{job_id}:final", body)
+
+    def getFinalResult(self, job_id):
+        return self.client.get(f"job:{job_id}:final")
 
     def save_summary(self, job_id, summary):
         body = json.dumps(summary)
@@ -80,4 +820,265 @@ class RedisService:
         self.client.hset(job_key, "result", body)
 
 
-redis_client = RedisService()
\ No newline at end of file
+redis_client = RedisService()
+
+
+
+class AsyncRedisService:
+    # asyncio counterpart of RedisService for the API. The pool is created
+    # and checked at application startup, not at import.
+    def __init__(self):
+        self.client = None
+        self.binary_client = None
+        self.pubsub_client = None
+
+    async def connect(self):
+        if self.client is None:
+            pool = redis.asyncio.BlockingConnectionPool(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                decode_responses=True,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                timeout=REDIS_POOL_TIMEOUT,
+            )
+            self.client = redis.asyncio.Redis(connection_pool=pool)
+
+            binary_pool = redis.asyncio.BlockingConnectionPool(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                decode_responses=False,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                timeout=REDIS_POOL_TIMEOUT,
+            )
+            self.binary_client = redis.asyncio.Redis(connection_pool=binary_pool)
+
+            # Subscriptions hold their connection for good, so they never
+            # come out of the pool the request handlers share.
+            self.pubsub_client = redis.asyncio.Redis(
+                host=REDIS_HOST,
+                port=REDIS_PORT,
+                db=REDIS_DB,
+                decode_responses=True,
+            )
+            self._fair_enqueue = self.client.register_script(FAIR_ENQUEUE_SCRIPT)
+            self._extend_lock = self.client.register_script(EXTEND_LOCK_SCRIPT)
+            self._release_lock = self.client.register_script(RELEASE_LOCK_SCRIPT)
+            self._admit_job = self.client.register_script(ADMIT_JOB_SCRIPT)
+
+        await self.client.ping()
+        logger.info(f"Async redis connection successful {REDIS_HOST}:{REDIS_PORT}")
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            await self.binary_client.aclose()
+            await self.pubsub_client.aclose()
+            self.client = None
+            self.binary_client = None
+            self.pubsub_client = None
+
+    def pubsub(self):
+        return self.pubsub_client.pubsub()
+
+    async def get_job_status(self, job_id):
+        return await self.client.hgetall(f"job:{job_id}")
+
+    async def jobCreation(self, job_id, priority=JOB_DEFAULT_PRIORITY):
+        pipe = self.client.pipeline(transaction=False)
+        create_job(pipe, job_id, priority)
+        await pipe.execute()
+
+    async def pushIntoQueue(self, queue_name, payload, priority=None):
+        # Same routing as the sync client: fair-share queues go through the
+        # job's sub-queue, weight and wake-up list.
+        if queue_name not in FAIR_SHARE_QUEUES:
+            await self.client.rpush(queue_name, task_body(payload))
+            return
+
+        priority = int(priority or JOB_DEFAULT_PRIORITY)
+        job_id = payload["job_id"]
+        keys = [job_queue_key(queue_name, job_id)] + fair_share_keys(queue_name)
+        await self._fair_enqueue(keys=keys, args=[job_id, priority, task_body({**payload, "priority": priority})])
+
+    async def getMetrics(self):
+        histogram_keys = sorted(await self.client.smembers(HISTOGRAMS_KEY))
+
+        pipe = self.client.pipeline(transaction=False)
+        for key in histogram_keys:
+            pipe.hgetall(key)
+        pipe.hgetall(COUNTERS_KEY)
+        pipe.hgetall("cache:stats")
+        *histograms, counters, cache_stats = await pipe.execute()
+
+        return dict(zip(histogram_keys, histograms)), counters, cache_stats
+
+    async def getQueueDepths(self, queue_names):
+        pipe = self.client.pipeline(transaction=False)
+        for queue_name in queue_names:
+            pipe.llen(queue_name)
+            pipe.llen(f"{queue_name}:processing")
+            pipe.llen(f"{queue_name}:dead")
+            pipe.zrange(f"{queue_name}:active", 0, -1)
+        results = await pipe.execute()
+
+        depths = {}
+        waiting_jobs = {}
+        for position, queue_name in enumerate(queue_names):
+            ready, processing, dead, active = results[position * 4:position * 4 + 4]
+            depths[queue_name] = {"ready": ready, "processing": processing, "dead": dead}
+            if active:
+                waiting_jobs[queue_name] = active
+
+        # Fair-share queues hold their ready tasks in per-job sub-queues.
+        if waiting_jobs:
+            pipe = self.client.pipeline(transaction=False)
+            for queue_name, job_ids in waiting_jobs.items():
+                for job_id in job_ids:
+                    pipe.llen(job_queue_key(queue_name, job_id))
+            lengths = iter(await pipe.execute())
+            for queue_name, job_ids in waiting_jobs.items():
+                depths[queue_name]["ready"] += sum(next(lengths) for void in job_ids)
+
+        return depths
+
+    async def getJobQueue(self, queue_name, job_id):
+        # Tasks the job still has waiting in a fair-share queue, and the
+        # enqueue time of the oldest one.
+        pipe = self.client.pipeline(transaction=False)
+        pipe.llen(job_queue_key(queue_name, job_id))
+        pipe.lindex(job_queue_key(queue_name, job_id), 0)
+        depth, head = await pipe.execute()
+
+        oldest = json.loads(head).get("enqueued_at") if head else None
+        return depth, oldest
+
+    async def getSpeakers(self, job_id):
+        return sorted(await self.client.smembers(speakers_key(job_id)))
+
+    async def getTranscripts(self, job_id, start_ms=None, end_ms=None, speakers=None):
+        wanted = speakers
+        if speakers is None:
+            speakers = await self.getSpeakers(job_id)
+        low, high = score_range(start_ms, end_ms)
+
+        pipe = self.binary_client.pipeline(transaction=False)
+        pipe.lrange(legacy_transcripts_key(job_id), 0, -1)
+        for speaker in speakers:
+            pipe.zrangebyscore(transcript_key(job_id, speaker), low, high)
+        legacy, *replies = await pipe.execute()
+
+        legacy = unpack_legacy_transcripts(legacy, start_ms, end_ms, wanted)
+        return merge_transcripts(speakers, replies, legacy)
+
+    async def getFinalResult(self, job_id):
+        return await self.client.get(f"job:{job_id}:final")
+
+    async def getRetainedJobs(self, offset, limit):
+        # Tracked jobs, soonest to be deleted first, with the total count.
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrange(RETENTION_JOBS_KEY, offset, offset + limit - 1)
+        pipe.zcard(RETENTION_JOBS_KEY)
+        job_ids, total = await pipe.execute()
+        return job_ids, total
+
+    async def getJobStorage(self, job_id):
+        speakers = await self.client.smembers(speakers_key(job_id))
+        keys = job_keys(job_id, speakers)
+
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hmget(f"job:{job_id}", "status", "created_at", "finished_at")
+        pipe.zscore(RETENTION_MEDIA_KEY, job_id)
+        pipe.zscore(RETENTION_JOBS_KEY, job_id)
+        for key in keys:
+            pipe.exists(key)
+        for key in keys:
+            pipe.memory_usage(key)
+        replies = await pipe.execute(raise_on_error=False)
+
+        (status, created_at, finished_at), media_expires_at, expires_at = replies[:3]
+        exists = replies[3:3 + len(keys)]
+        sizes = replies[3 + len(keys):]
+
+        # MEMORY USAGE is not available everywhere (e.g. some managed or
+        # emulated servers); the byte count is then left out.
+        redis_bytes = None
+        if all(isinstance(size, int) or size is None for size in sizes):
+            redis_bytes = sum(size or 0 for size in sizes)
+
+        return {
+            "status": status,
+            "created_at": float(created_at) if created_at else None,
+            "finished_at": float(finished_at) if finished_at else None,
+            "media_expires_at": media_expires_at,
+            "expires_at": expires_at,
+            "redis_keys": sum(exists),
+            "redis_bytes": redis_bytes,
+        }
+
+    async def getThroughput(self, window=ADMISSION_THROUGHPUT_WINDOW):
+        # Audio seconds transcribed per second, averaged over the finished
+        # minutes of the window in which anything was transcribed. None until
+        # something has been.
+        current = int(time.time() // 60)
+        minutes = range(current - max(1, window // 60), current)
+        values = await self.client.mget([throughput_key(minute) for minute in minutes])
+
+        busy = [float(value) for value in values if value and float(value) > 0]
+        if not busy:
+            return None
+        return sum(busy) / (60 * len(busy))
+
+    async def admitJob(self, job_id, cost, capacity, max_jobs):
+        admitted, backlog, jobs = await self._admit_job(
+            keys=[ADMISSION_KEY], args=[job_id, round(cost, 3), round(capacity, 3), max_jobs]
+        )
+        if not admitted:
+            pipe = self.client.pipeline(transaction=False)
+            count(pipe, "jobs_rejected")
+            await pipe.execute()
+        return bool(admitted), float(backlog), int(jobs)
+
+    async def releaseAdmission(self, job_id):
+        await self.client.hdel(ADMISSION_KEY, job_id)
+
+    async def getRedisMemory(self):
+        try:
+            info = await self.client.info("memory")
+        except redis.exceptions.ResponseError:
+            return None
+        return info.get("used_memory")
+
+    async def uploadCreation(self, upload_id, **meta):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(f"upload:{upload_id}", mapping=meta)
+        if RETENTION_UPLOAD_SECONDS > 0:
+            pipe.expire(f"upload:{upload_id}", RETENTION_UPLOAD_SECONDS)
+        await pipe.execute()
+
+    async def touchUpload(self, upload_id):
+        # Abandoned uploads expire; every appended part restarts the clock.
+        if RETENTION_UPLOAD_SECONDS > 0:
+            await self.client.expire(f"upload:{upload_id}", RETENTION_UPLOAD_SECONDS)
+
+    async def get_upload(self, upload_id):
+        return await self.client.hgetall(f"upload:{upload_id}")
+
+    async def deleteUpload(self, upload_id):
+        await self.client.delete(f"upload:{upload_id}")
+
+    async def acquireLock(self, name, ttl_seconds, token=1):
+        return bool(await self.client.set(f"lock:{name}", token, nx=True, ex=ttl_seconds))
+
+    async def extendLock(self, name, ttl_seconds, token):
+        return bool(await self._extend_lock(keys=[f"lock:{name}"], args=[token, int(ttl_seconds)]))
+
+    async def releaseLock(self, name, token=None):
+        if token is None:
+            await self.client.delete(f"lock:{name}")
+        else:
+            await self._release_lock(keys=[f"lock:{name}"], args=[token])
+
+
+async_redis_client = AsyncRedisService()
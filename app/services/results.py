@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from app.config import RESULT_CACHE_SIZE
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+def format_transcripts(transcripts_list):
+
+    if not transcripts_list:
+        return {}
+
+    logger.info("Inside format_transcripts in app.services.results")
+
+    people = {}
+    how_many = {}
+    speakers = []
+
+    for transcript in transcripts_list:
+        person = transcript.get("speaker", "Unknown")
+        words = transcript.get("text", "")
+
+        if words.strip() != "":
+            if person not in people:
+                people[person] = []
+            people[person].append(words)
+            if person in how_many:
+                how_many[person] = how_many[person] + 1
+            else:
+                how_many[person] = 1
+
+    for p in people:
+        speakers.append(p)
+
+    logger.debug(
+        {
+            "per_person": people,
+            "speakers": speakers,
+            "counts": how_many
+        }
+    )
+
+    return {
+        "per_person": people, 
+        "speakers": speakers, 
+        "counts": how_many
+    }
+
+def build_final_response(job_id, summary, transcripts_list):
+    return {
+        "job_id": job_id,
+        "status": "complete",
+        "summary": summary,
+        **format_transcripts(transcripts_list)
+    }
+
+
+class FinalDocument:
+    def __init__(self, body):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6)
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class FinalDocumentCache:
+    # Completed jobs never change, so their documents can be kept in-process.
+    def __init__(self, size=RESULT_CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        with self._lock:
+            document = self._items.get(job_id)
+            if document is not None:
+                self._items.move_to_end(job_id)
+            return document
+
+    def put(self, job_id, document):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._items[job_id] = document
+            self._items.move_to_end(job_id)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def discard(self, job_id):
+        with self._lock:
+            self._items.pop(job_id, None)
+
+
+final_documents = FinalDocumentCache()
@@ -0,0 +1,109 @@
+import os
+import time
+import shutil
+from app.config import (
+    SCRATCH_DIR,
+    PARTIAL_UPLOAD_DIR,
+    RETENTION_UPLOAD_SECONDS,
+    RETENTION_SCRATCH_SECONDS,
+    RETENTION_SWEEP_INTERVAL,
+    RETENTION_SWEEP_BATCH,
+    ADMISSION_ENABLED,
+    ADMISSION_STALE_SECONDS,
+)
+from app.services.redis_service import redis_client, RETENTION_MEDIA_KEY, RETENTION_JOBS_KEY
+from app.services.blob_store import blob_store
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+SWEEP_LOCK = "retention-sweep"
+
+def job_prefix(job_id):
+    return f"{job_id}/"
+
+def sweep_media(now, limit=RETENTION_SWEEP_BATCH):
+    removed = 0
+    while True:
+        job_ids = redis_client.dueForRetention(RETENTION_MEDIA_KEY, now, limit)
+        for job_id in job_ids:
+            # Media, diarization and any PCM left behind by a crashed worker.
+            blob_store.delete_prefix(job_prefix(job_id))
+            redis_client.clearMediaRetention(job_id)
+        removed += len(job_ids)
+        if len(job_ids) < limit:
+            return removed
+
+def sweep_jobs(now, limit=RETENTION_SWEEP_BATCH):
+    removed = 0
+    while True:
+        job_ids = redis_client.dueForRetention(RETENTION_JOBS_KEY, now, limit)
+        for job_id in job_ids:
+            blob_store.delete_prefix(job_prefix(job_id))
+            redis_client.deleteJob(job_id)
+        removed += len(job_ids)
+        if len(job_ids) < limit:
+            return removed
+
+def sweep_admissions(now):
+    released = redis_client.releaseStaleAdmissions(now, ADMISSION_STALE_SECONDS)
+    for job_id in released:
+        logger.warning(f"Released admission of job {job_id}, which was never enqueued")
+    return len(released)
+
+def last_modified(entry):
+    # A directory's own mtime doesn't change while a file in it is written.
+    latest = entry.stat(follow_symlinks=False).st_mtime
+    if entry.is_dir(follow_symlinks=False):
+        for child in os.scandir(entry.path):
+            latest = max(latest, child.stat(follow_symlinks=False).st_mtime)
+    return latest
+
+def sweep_directory(directory, ttl_seconds, now):
+    if ttl_seconds <= 0 or not os.path.isdir(directory):
+        return 0
+
+    removed = 0
+    for entry in os.scandir(directory):
+        try:
+            if now - last_modified(entry) < ttl_seconds:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+            removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+def directory_usage(directory):
+    size = 0
+    for dirpath, void, filenames in os.walk(directory):
+        for filename in filenames:
+            try:
+                size += os.path.getsize(os.path.join(dirpath, filename))
+            except FileNotFoundError:
+                pass
+    return size
+
+def sweep_once(now=None):
+    now = now or time.time()
+
+    # Scratch and partial uploads are node-local, so every node's sweeper
+    # cleans its own.
+    stats = {
+        "scratch": sweep_directory(SCRATCH_DIR, RETENTION_SCRATCH_SECONDS, now),
+        "partial_uploads": sweep_directory(PARTIAL_UPLOAD_DIR, RETENTION_UPLOAD_SECONDS, now),
+    }
+
+    # Jobs are shared: the lock is left to expire so only one sweeper per
+    # interval handles them.
+    if redis_client.acquireLock(SWEEP_LOCK, max(1, int(RETENTION_SWEEP_INTERVAL))):
+        redis_client.backfillRetention()
+        stats["media"] = sweep_media(now)
+        stats["jobs"] = sweep_jobs(now)
+        if ADMISSION_ENABLED:
+            stats["admissions"] = sweep_admissions(now)
+
+    return stats
@@ -0,0 +1,353 @@
+import json
+import time
+import random
+import asyncio
+import contextvars
+from app.config import (
+    GEMINI_API_KEY,
+    GEMINI_MODEL_NAME,
+    GEMINI_BASE_URL,
+    GEMINI_PROMPT_INSTRUCTION,
+    GEMINI_MERGE_INSTRUCTION,
+    SUMMARY_LLM_BACKEND,
+    SUMMARY_WINDOW_MS,
+    SUMMARY_MAX_CONCURRENCY,
+    SUMMARY_REDUCE_FAN_IN,
+    SUMMARY_LLM_RPM,
+    SUMMARY_LLM_TPM,
+    SUMMARY_LLM_OUTPUT_TOKENS,
+    SUMMARY_LLM_TIMEOUT,
+    SUMMARY_LLM_MAX_RETRIES,
+    SUMMARY_LLM_BACKOFF_BASE,
+    SUMMARY_LLM_BACKOFF_MAX,
+)
+from app.services.cache import ResultCache, content_digest
+from app.services.redis_service import redis_client
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+SUMMARY_LIST_KEYS = ("keypoints", "decisions", "action_items")
+MAX_KEYPOINTS = 10
+
+# Seconds a job has spent waiting on the model. The worker sets a fresh
+# accumulator per job; concurrent requests of that job all add to it.
+llm_seconds = contextvars.ContextVar("llm_seconds", default=None)
+
+
+class GeminiClient:
+    def __init__(self, api_key=GEMINI_API_KEY, model_name=GEMINI_MODEL_NAME, base_url=GEMINI_BASE_URL):
+        from google import genai
+        from google.genai import types
+
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY is not set.")
+
+        logger.info(f"Gemini ai model anme: {model_name}")
+        self.model_name = model_name
+        http_options = types.HttpOptions(base_url=base_url) if base_url else None
+        self.client = genai.Client(api_key=api_key, http_options=http_options)
+
+    async def generate(self, contents):
+        resp = await self.client.aio.models.generate_content(model=self.model_name, contents=contents)
+        return getattr(resp, "text", "")
+
+
+class StubClient:
+    # Answers locally without a network call, for tests and offline runs.
+    model_name = "stub"
+
+    async def generate(self, contents):
+        return stub_reply(contents)
+
+
+def stub_reply(contents):
+    payload = json.loads(contents)
+
+    if "partial_summaries" in payload:
+        return json.dumps(combine_summaries(payload["partial_summaries"]))
+
+    per_person = payload.get("per_person_transcripts", {})
+    keypoints = []
+    per_speaker_summary = {}
+    for speaker, texts in per_person.items():
+        keypoints.append(f"{speaker}: {texts[0][:80]}")
+        per_speaker_summary[speaker] = f"{len(texts)} statements"
+
+    return json.dumps({
+        "keypoints": keypoints[:MAX_KEYPOINTS],
+        "decisions": [],
+        "action_items": [],
+        "per_speaker_summary": per_speaker_summary,
+    })
+
+
+class TokenBucket:
+    # Refills per_minute units evenly over a minute and holds at most one
+    # minute's worth, matching how per-minute API quotas are enforced.
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self, amount):
+        amount = min(float(amount), self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    def __init__(self, rpm=SUMMARY_LLM_RPM, tpm=SUMMARY_LLM_TPM):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.paused_until = 0.0
+        # Callers are admitted one at a time, in arrival order.
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        # A 429 means the quota is spent for everyone, not just one request.
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, tokens):
+        async with self._lock:
+            while time.monotonic() < self.paused_until:
+                await asyncio.sleep(self.paused_until - time.monotonic())
+            if self.requests:
+                await self.requests.take(1)
+            if self.tokens:
+                await self.tokens.take(tokens)
+
+
+def estimate_tokens(contents):
+    return len(contents) // 4 + SUMMARY_LLM_OUTPUT_TOKENS
+
+def error_status(error):
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+def is_retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+
+    status = error_status(error)
+    if status is not None:
+        return status == 429 or status >= 500
+
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(error, httpx.TransportError)
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class RateLimitedClient:
+    # Bounds in-flight requests, spends the per-minute request/token budget
+    # before each call, times calls out and retries transient failures with
+    # full-jitter exponential backoff.
+    def __init__(self, client, limiter=None, max_in_flight=SUMMARY_MAX_CONCURRENCY,
+                 timeout=SUMMARY_LLM_TIMEOUT, max_retries=SUMMARY_LLM_MAX_RETRIES):
+        self.client = client
+        self.model_name = client.model_name
+        self.limiter = limiter or RateLimiter()
+        self.in_flight = asyncio.Semaphore(max(1, max_in_flight))
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    async def generate(self, contents):
+        tokens = estimate_tokens(contents)
+
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(tokens)
+            try:
+                async with self.in_flight:
+                    return await asyncio.wait_for(self.client.generate(contents), self.timeout)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+
+                delay = random.uniform(0, min(SUMMARY_LLM_BACKOFF_MAX, SUMMARY_LLM_BACKOFF_BASE * 2 ** attempt))
+                if error_status(e) == 429:
+                    delay = retry_after(e) or delay
+                    self.limiter.pause(delay)
+
+                logger.warning(f"LLM call failed ({e!r}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+class CachedClient:
+    # Identical prompts to the same model are answered from the cache.
+    def __init__(self, client, cache=None):
+        self.client = client
+        self.model_name = client.model_name
+        self.cache = cache or ResultCache("summary")
+
+    async def generate(self, contents):
+        digest = content_digest(contents, self.model_name)
+
+        summary_text = await asyncio.to_thread(self.cache.get, digest)
+        if summary_text is not None:
+            return summary_text
+
+        started = time.monotonic()
+        summary_text = await self.client.generate(contents)
+        elapsed = time.monotonic() - started
+
+        spent = llm_seconds.get()
+        if spent is not None:
+            spent[0] += elapsed
+
+        try:
+            await asyncio.to_thread(redis_client.recordLlmCall, elapsed)
+        except Exception as e:
+            logger.warning(f"Couldn't record LLM call metrics: {e}")
+
+        # Unparseable replies are not cached so a retry can do better.
+        if "raw" not in parse_summary(summary_text):
+            await asyncio.to_thread(self.cache.set, digest, summary_text)
+        return summary_text
+
+
+def get_llm_client(backend=SUMMARY_LLM_BACKEND):
+    if backend == "stub":
+        client = StubClient()
+    elif backend == "gemini":
+        client = RateLimitedClient(GeminiClient())
+    else:
+        raise ValueError(f"Unknown SUMMARY_LLM_BACKEND: {backend}")
+    return CachedClient(client)
+
+
+def parse_summary(summary_text):
+    try:
+        return json.loads(summary_text)
+    except Exception:
+
+        try:
+            a = summary_text.find("{")
+            b = summary_text.rfind("}")
+            if a != -1 and b != -1:
+                return json.loads(summary_text[a:b + 1])
+            return {"raw": summary_text}
+        except Exception:
+            return {"raw": summary_text}
+
+
+def group_by_speaker(transcripts_list):
+    per_person = {}
+    for transcript in transcripts_list:
+        speaker = transcript["speaker"]
+        speaker_text = transcript["text"]
+
+        stripped_text = speaker_text.strip()
+        if stripped_text:
+            if speaker not in per_person:
+                per_person[speaker] = []
+            per_person[speaker].append(speaker_text)
+    return per_person
+
+
+def split_windows(transcripts_list, window_ms=SUMMARY_WINDOW_MS):
+    ordered = sorted(transcripts_list, key=lambda t: int(t.get("timestamp_ms") or 0))
+    if not ordered:
+        return []
+
+    windows = []
+    window_start = None
+    for transcript in ordered:
+        timestamp = int(transcript.get("timestamp_ms") or 0)
+        if window_start is None or timestamp - window_start >= window_ms:
+            windows.append([])
+            window_start = timestamp
+        windows[-1].append(transcript)
+    return windows
+
+
+def combine_summaries(partials):
+    # Deterministic merge used when the model's reduce output is unusable.
+    combined = {"keypoints": [], "decisions": [], "action_items": [], "per_speaker_summary": {}}
+
+    for partial in partials:
+        for key in SUMMARY_LIST_KEYS:
+            for item in partial.get(key) or []:
+                if item not in combined[key]:
+                    combined[key].append(item)
+
+        for speaker, summary in (partial.get("per_speaker_summary") or {}).items():
+            if speaker in combined["per_speaker_summary"]:
+                combined["per_speaker_summary"][speaker] += " " + str(summary)
+            else:
+                combined["per_speaker_summary"][speaker] = str(summary)
+
+    combined["keypoints"] = combined["keypoints"][:MAX_KEYPOINTS]
+    return combined
+
+
+async def summarize_window(client, transcripts_list):
+    prompt_payload = {
+        "instruction": GEMINI_PROMPT_INSTRUCTION,
+        "per_person_transcripts": group_by_speaker(transcripts_list)
+    }
+    summary_text = await client.generate(json.dumps(prompt_payload, ensure_ascii=False))
+    return parse_summary(summary_text)
+
+
+async def merge_partials(client, partials):
+    prompt_payload = {
+        "instruction": GEMINI_MERGE_INSTRUCTION,
+        "partial_summaries": partials
+    }
+    summary_text = await client.generate(json.dumps(prompt_payload, ensure_ascii=False))
+    merged = parse_summary(summary_text)
+
+    if "raw" in merged:
+        logger.warning("Merge step returned unparseable output, combining partials locally")
+        return combine_summaries(partials)
+    return merged
+
+
+async def merge_group(client, group):
+    # A lone leftover partial goes up a level as is, not through the model.
+    if len(group) == 1:
+        return group[0]
+    return await merge_partials(client, group)
+
+
+async def reduce_summaries(client, partials, fan_in=SUMMARY_REDUCE_FAN_IN):
+    partials = [partial for partial in partials if "raw" not in partial] or partials
+    fan_in = max(2, fan_in)
+
+    while len(partials) > 1:
+        groups = [partials[i:i + fan_in] for i in range(0, len(partials), fan_in)]
+        logger.info(f"Reducing {len(partials)} partial summaries in {len(groups)} groups")
+        partials = list(await asyncio.gather(*(merge_group(client, group) for group in groups)))
+
+    return partials[0] if partials else {}
+
+
+async def summarize_transcripts(client, transcripts_list, window_ms=SUMMARY_WINDOW_MS):
+    windows = split_windows(transcripts_list, window_ms)
+    logger.info(f"Summarizing {len(transcripts_list)} transcripts in {len(windows)} windows")
+
+    if len(windows) <= 1:
+        return await summarize_window(client, transcripts_list)
+
+    partials = await asyncio.gather(*(summarize_window(client, window) for window in windows))
+    return await reduce_summaries(client, list(partials))
@@ -1,25 +1,293 @@
-import os
-import whisper
-from pydub import AudioSegment
+import time
+import queue
+import threading
+from contextlib import contextmanager
+import numpy as np
+from app.config import (
+    WHISPER_MODEL,
+    WHISPER_POOL_SIZE,
+    ASR_BACKEND,
+    ASR_COMPUTE_TYPE,
+    ASR_BEAM_SIZE,
+    ASR_STUB_RTF,
+)
+from app.services.cache import ResultCache, content_digest
 from app.logger import get_logger
 
 logger = get_logger(__name__)
 
-def load_model():
-    model = whisper.load_model("base")
-    logger.info("Whisper model loaded")
+asr_cache = ResultCache("asr")
+
+# Whisper decodes 30s windows; longer audio needs sliding-window transcription.
+WINDOW_SAMPLES = 30 * 16000
+
+# whisper's transcribe() defaults. Batched decoding applies the same fallback
+# and silence rules, so both modes give the same text for the same audio and
+# can share asr_cache entries.
+WHISPER_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+WHISPER_COMPRESSION_RATIO_THRESHOLD = 2.4
+WHISPER_LOGPROB_THRESHOLD = -1.0
+WHISPER_NO_SPEECH_THRESHOLD = 0.6
+
+def is_silence(result):
+    return result.no_speech_prob > WHISPER_NO_SPEECH_THRESHOLD and result.avg_logprob < WHISPER_LOGPROB_THRESHOLD
+
+def needs_fallback(result):
+    if is_silence(result):
+        return False
+    return result.compression_ratio > WHISPER_COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < WHISPER_LOGPROB_THRESHOLD
+
+
+class WhisperBackend:
+    name = "whisper"
+    # Plain torch modules survive fork, so the supervisor can preload them.
+    fork_safe = True
+
+    def __init__(self, model_name=WHISPER_MODEL):
+        import whisper
+
+        self.whisper = whisper
+        self.model_name = model_name
+        self.model = whisper.load_model(model_name)
+
+    def transcribe(self, audio):
+        res = self.model.transcribe(audio, fp16=False)
+        return res.get("text", "").strip()
+
+    def transcribe_batch(self, chunks):
+        import torch
+
+        whisper = self.whisper
+        texts = [""] * len(chunks)
+        windows = []
+
+        for position, audio in enumerate(chunks):
+            # Anything longer than one 30s window needs transcribe()'s
+            # sliding-window decoding, so it is not batched.
+            if len(audio) > WINDOW_SAMPLES:
+                texts[position] = self.transcribe(audio)
+                continue
+
+            audio = whisper.pad_or_trim(audio)
+            mel = whisper.log_mel_spectrogram(audio, self.model.dims.n_mels).to(self.model.device)
+            windows.append((position, mel))
+
+        # Windows that fail at one temperature are re-decoded together at the
+        # next, keeping the last attempt once the temperatures run out.
+        results = [None] * len(windows)
+        pending = list(range(len(windows)))
+        for temperature in WHISPER_TEMPERATURES:
+            if not pending:
+                break
+            mels = torch.stack([windows[i][1] for i in pending])
+            options = whisper.DecodingOptions(fp16=False, temperature=temperature)
+            decoded = whisper.decode(self.model, mels, options)
+
+            for i, result in zip(pending, decoded):
+                results[i] = result
+            pending = [i for i in pending if needs_fallback(results[i])]
+
+        for (position, void), result in zip(windows, results):
+            if not is_silence(result):
+                texts[position] = result.text.strip()
+
+        return texts
+
+
+class FasterWhisperBackend:
+    name = "faster-whisper"
+    # CTranslate2 starts its thread pool on load, and those threads do not
+    # exist in a forked child, so each process loads its own copy.
+    fork_safe = False
+
+    def __init__(self, model_name=WHISPER_MODEL, compute_type=ASR_COMPUTE_TYPE, beam_size=ASR_BEAM_SIZE):
+        from faster_whisper import WhisperModel
+
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.beam_size = beam_size
+        self.model = WhisperModel(model_name, device="cpu", compute_type=compute_type)
+
+    def transcribe(self, audio):
+        segments, info = self.model.transcribe(audio, beam_size=self.beam_size)
+        return "".join(segment.text for segment in segments).strip()
+
+    def transcribe_batch(self, chunks):
+        return [self.transcribe(audio) for audio in chunks]
+
+
+class StubBackend:
+    # Answers locally without a model, for benchmarks and offline runs.
+    # ASR_STUB_RTF seconds of delay per second of audio stand in for compute.
+    name = "stub"
+    fork_safe = True
+
+    def __init__(self, model_name=WHISPER_MODEL, rtf=ASR_STUB_RTF):
+        self.model_name = model_name
+        self.rtf = rtf
+
+    def transcribe(self, audio):
+        seconds = len(audio) / WINDOW_SAMPLES * 30
+        if self.rtf > 0:
+            time.sleep(seconds * self.rtf)
+        return " ".join(f"word{i}" for i in range(max(1, int(seconds * 2.5))))
+
+    def transcribe_batch(self, chunks):
+        return [self.transcribe(audio) for audio in chunks]
+
+
+ASR_BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+    StubBackend.name: StubBackend,
+}
+
+def backend_class(backend=None):
+    backend = backend or ASR_BACKEND
+    if backend not in ASR_BACKENDS:
+        raise ValueError(f"Unknown ASR_BACKEND: {backend}")
+    return ASR_BACKENDS[backend]
+
+def backend_cache_id(model_name=None, backend=None):
+    model_name = model_name or WHISPER_MODEL
+    backend = backend or ASR_BACKEND
+    if backend == FasterWhisperBackend.name:
+        return f"{backend}:{model_name}:{ASR_COMPUTE_TYPE}"
+    return f"{backend}:{model_name}"
+
+def load_model(model_name=WHISPER_MODEL, backend=None):
+    model = backend_class(backend)(model_name)
+    logger.info(f"ASR model loaded: {backend_cache_id(model_name, backend)}")
     return model
 
-def transcribe_audio(file_path):
-    logger.info(f"Inside transcribe_audio adn file_path: {file_path}")
+
+class ModelPool:
+    def __init__(self, model_name=WHISPER_MODEL, size=WHISPER_POOL_SIZE, backend=None):
+        self.model_name = model_name
+        self.backend = backend or ASR_BACKEND
+        self.size = max(1, int(size))
+        self._idle = queue.Queue()
+        self._loaded = 0
+        self._lock = threading.Lock()
+
+    def preload(self):
+        while self._reserve_slot():
+            self._idle.put(self._load())
+        logger.info(f"Model pool ready: {self.size} x {self.backend}:{self.model_name}")
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        model = self._take(timeout)
+        try:
+            yield model
+        finally:
+            self._idle.put(model)
+
+    def _take(self, timeout):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        if self._reserve_slot():
+            return self._load()
+
+        return self._idle.get(timeout=timeout)
+
+    def _reserve_slot(self):
+        with self._lock:
+            if self._loaded >= self.size:
+                return False
+            self._loaded += 1
+            return True
+
+    def _load(self):
+        try:
+            return load_model(self.model_name, self.backend)
+        except Exception:
+            with self._lock:
+                self._loaded -= 1
+            raise
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_model_pool(model_name=None, backend=None):
+    model_name = model_name or WHISPER_MODEL
+    backend = backend or ASR_BACKEND
+    with _pools_lock:
+        if (backend, model_name) not in _pools:
+            _pools[(backend, model_name)] = ModelPool(model_name, backend=backend)
+        return _pools[(backend, model_name)]
+
+def transcribe_audio(audio, model_name=None):
+    logger.info(f"Inside transcribe_audio with {0 if audio is None else len(audio)} samples")
     
-    if not os.path.exists(file_path):
-        logger.warning(f"File not found {file_path}")
+    if audio is None or len(audio) == 0:
+        logger.warning("Empty audio chunk")
         return ""
 
-    model = load_model()
-    res = model.transcribe(file_path, fp16=False)
-    text = res.get("text", "").strip()
+    with get_model_pool(model_name).acquire() as model:
+        text = model.transcribe(audio)
 
     logger.info(f"Transcription: {text[:50]}")
-    return text
\ No newline at end of file
+    return text
+
+
+def transcribe_batch(chunks, model_name=None):
+    if len(chunks) == 1:
+        return [transcribe_audio(chunks[0], model_name)]
+
+    logger.info(f"Inside transcribe_batch with {len(chunks)} chunks")
+
+    texts = [""] * len(chunks)
+    positions = []
+    for position, audio in enumerate(chunks):
+        if audio is None or len(audio) == 0:
+            logger.warning("Empty audio chunk")
+            continue
+        positions.append(position)
+
+    if positions:
+        with get_model_pool(model_name).acquire() as model:
+            fresh = model.transcribe_batch([chunks[position] for position in positions])
+        for position, text in zip(positions, fresh):
+            texts[position] = text
+
+    logger.info(f"Batch transcribed {len(positions)} of {len(chunks)} chunks")
+    return texts
+
+
+def transcribe_chunks(chunks, model_name=None):
+    # Identical audio under the same backend and model is only transcribed
+    # once. Also returns the positions that actually went through ASR.
+    cache_id = backend_cache_id(model_name)
+
+    digests = []
+    for audio in chunks:
+        if audio is None or len(audio) == 0:
+            digests.append(None)
+        else:
+            digests.append(content_digest(np.ascontiguousarray(audio, dtype=np.float32), cache_id))
+
+    lookup = [digest for digest in digests if digest]
+    cached = dict(zip(lookup, asr_cache.get_many(lookup)))
+
+    texts = [""] * len(chunks)
+    missing = []
+    for position, digest in enumerate(digests):
+        if not digest:
+            continue
+        if cached.get(digest) is None:
+            missing.append(position)
+        else:
+            texts[position] = cached[digest]
+
+    if missing:
+        fresh = transcribe_batch([chunks[position] for position in missing], model_name)
+        for position, text in zip(missing, fresh):
+            texts[position] = text
+        asr_cache.set_many([(digests[position], texts[position]) for position in missing])
+
+    return texts, missing
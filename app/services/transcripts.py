@@ -0,0 +1,77 @@
+import json
+import heapq
+import msgpack
+
+# Transcript fragments of a job live in one sorted set per speaker, scored by
+# timestamp_ms, with the speaker names in a set:
+#
+#   job:<id>:speakers                 {"Alice", "Bob"}
+#   job:<id>:transcripts:<speaker>    msgpack([chunk_index, timestamp_ms, text]) -> timestamp_ms
+#
+# The speaker is only stored in the key and records carry no field names. A
+# time window is one ZRANGEBYSCORE per speaker and one speaker's lines are a
+# single read. Records are usually longer than zset-max-listpack-value (64
+# bytes), so these sets are skiplist-encoded, with a skiplist node and dict
+# entry per record on top of its bytes; the layout is for ordered, filtered
+# reads, not for memory.
+
+def legacy_transcripts_key(job_id):
+    # JSON list written before per-speaker sets; still read so jobs finished
+    # or in flight across that change keep their transcripts.
+    return f"job:{job_id}:transcripts"
+
+def speakers_key(job_id):
+    return f"job:{job_id}:speakers"
+
+def transcript_key(job_id, speaker):
+    return f"job:{job_id}:transcripts:{speaker}"
+
+def pack_transcript(chunk_data):
+    record = [chunk_data.get("chunk_index"), chunk_data.get("timestamp_ms"), chunk_data.get("text") or ""]
+    return msgpack.packb(record, use_bin_type=True)
+
+def transcript_score(chunk_data):
+    return int(chunk_data.get("timestamp_ms") or 0)
+
+def score_range(start_ms=None, end_ms=None):
+    # Windows are half-open: [start_ms, end_ms).
+    low = "-inf" if start_ms is None else int(start_ms)
+    high = "+inf" if end_ms is None else f"({int(end_ms)}"
+    return low, high
+
+def unpack_transcripts(speaker, members):
+    transcripts = []
+    for member in members:
+        chunk_index, timestamp_ms, text = msgpack.unpackb(member, raw=False)
+        transcripts.append({
+            "speaker": speaker,
+            "text": text,
+            "timestamp_ms": timestamp_ms,
+            "chunk_index": chunk_index,
+        })
+    return transcripts
+
+def sort_key(transcript):
+    # Legacy list records from before chunk indexes carry no chunk_index.
+    chunk_index = transcript.get("chunk_index")
+    return (int(transcript.get("timestamp_ms") or 0), -1 if chunk_index is None else chunk_index)
+
+def unpack_legacy_transcripts(items, start_ms=None, end_ms=None, speakers=None):
+    transcripts = []
+    for item in items:
+        transcript = json.loads(item)
+        timestamp_ms = int(transcript.get("timestamp_ms") or 0)
+        if start_ms is not None and timestamp_ms < int(start_ms):
+            continue
+        if end_ms is not None and timestamp_ms >= int(end_ms):
+            continue
+        if speakers is not None and transcript.get("speaker") not in speakers:
+            continue
+        transcripts.append(transcript)
+    return sorted(transcripts, key=sort_key)
+
+def merge_transcripts(speakers, replies, legacy=()):
+    # Each speaker's set is already in time order, so a k-way merge gives the
+    # whole meeting in chronological order.
+    per_speaker = [unpack_transcripts(speaker, members) for speaker, members in zip(speakers, replies)]
+    return list(heapq.merge(*per_speaker, legacy, key=sort_key))
@@ -0,0 +1,218 @@
+import os
+import json
+import hashlib
+from python_multipart.multipart import MultipartParser, parse_options_header
+from python_multipart.exceptions import FormParserError
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from app.config import UPLOAD_CHUNK_SIZE, UPLOAD_MAX_BYTES, ALLOWED_MEDIA_EXTENSIONS
+from app.services.audio_extractor import has_audio_stream
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+def media_extension(filename):
+    file_extension = os.path.splitext(filename or "")[1].lower()
+
+    if file_extension not in ALLOWED_MEDIA_EXTENSIONS:
+        allowed = ", ".join(ALLOWED_MEDIA_EXTENSIONS)
+        reason = f"Unsupported media type '{file_extension}', allowed: {allowed}"
+        raise HTTPException(status_code=400, detail=reason)
+
+    return file_extension
+
+async def iter_upload(upload, chunk_size=UPLOAD_CHUNK_SIZE):
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+def _write_chunk(handle, hasher, chunk):
+    handle.write(chunk)
+    hasher.update(chunk)
+
+async def stream_to_file(chunks, path, mode="wb", written=0, max_bytes=UPLOAD_MAX_BYTES):
+    # Only one chunk is held in memory at a time, and both the disk write and
+    # the hashing run in the threadpool so the event loop stays free.
+    hasher = hashlib.sha256()
+    size = written
+
+    handle = await run_in_threadpool(open, path, mode)
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                reason = f"Upload exceeds the {max_bytes} byte limit"
+                raise HTTPException(status_code=413, detail=reason)
+
+            await run_in_threadpool(_write_chunk, handle, hasher, chunk)
+    finally:
+        await run_in_threadpool(handle.close)
+
+    return size - written, hasher.hexdigest()
+
+# Form fields other than files are short (a checksum, a priority).
+MAX_FORM_FIELD_BYTES = 64 * 1024
+
+
+class FormReceiver:
+    # Parses a multipart body as it arrives and writes each file part straight
+    # to the path part_path(name, filename) gives for it, hashing it on the
+    # way. Starlette's form parsing would spool the body to a temporary file
+    # first, which then had to be copied again.
+    def __init__(self, part_path, max_bytes=UPLOAD_MAX_BYTES):
+        self.part_path = part_path
+        self.max_bytes = max_bytes
+        self.fields = {}
+        self.files = {}
+        self._handles = []
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._header_name = b""
+        self._header_value = b""
+        self._name = None
+        self._data = bytearray()
+        self._file = None
+
+    def on_header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        disposition, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" not in options:
+            return
+
+        filename = options[b"filename"].decode("utf-8", "replace")
+        path = self.part_path(self._name, filename)
+        if path is None or self._name in self.files:
+            raise HTTPException(status_code=400, detail=f"Unexpected file field '{self._name}'")
+
+        handle = open(path, "wb")
+        self._handles.append(handle)
+        self._file = {"filename": filename, "path": path, "size": 0, "hasher": hashlib.sha256(), "handle": handle}
+
+    def on_part_data(self, data, start, end):
+        chunk = data[start:end]
+        if self._file is None:
+            self._data += chunk
+            if len(self._data) > MAX_FORM_FIELD_BYTES:
+                raise HTTPException(status_code=400, detail=f"Form field '{self._name}' is too long")
+            return
+
+        self._file["size"] += len(chunk)
+        if self.max_bytes and self._file["size"] > self.max_bytes:
+            reason = f"Upload exceeds the {self.max_bytes} byte limit"
+            raise HTTPException(status_code=413, detail=reason)
+        self._file["handle"].write(chunk)
+        self._file["hasher"].update(chunk)
+
+    def on_part_end(self):
+        if self._file is None:
+            self.fields[self._name] = self._data.decode("utf-8", "replace")
+            return
+
+        self._file["handle"].close()
+        self.files[self._name] = {
+            "filename": self._file["filename"],
+            "path": self._file["path"],
+            "size": self._file["size"],
+            "sha256": self._file["hasher"].hexdigest(),
+        }
+
+    def close(self):
+        for handle in self._handles:
+            handle.close()
+
+async def receive_form(request, part_path, max_bytes=UPLOAD_MAX_BYTES):
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    receiver = FormReceiver(part_path, max_bytes)
+    receiver.on_part_begin()
+    callbacks = {
+        name: getattr(receiver, name)
+        for name in (
+            "on_part_begin", "on_part_data", "on_part_end",
+            "on_header_field", "on_header_value", "on_header_end", "on_headers_finished",
+        )
+    }
+    parser = MultipartParser(options[b"boundary"], callbacks)
+
+    # Parsing, and with it the file writes and hashing, runs in the
+    # threadpool a chunk at a time, like stream_to_file.
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(parser.write, chunk)
+        await run_in_threadpool(parser.finalize)
+    except FormParserError as e:
+        logger.error(f"Invalid multipart body: {e}")
+        raise HTTPException(status_code=400, detail="Invalid multipart body")
+    finally:
+        await run_in_threadpool(receiver.close)
+
+    return receiver.fields, receiver.files
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+async def file_sha256(path):
+    return await run_in_threadpool(_hash_file, path)
+
+def check_checksum(expected, actual):
+    if expected and expected.lower() != actual:
+        reason = f"Checksum mismatch: expected {expected}, got {actual}"
+        raise HTTPException(status_code=400, detail=reason)
+
+def _read_head(path, size):
+    with open(path, "rb") as f:
+        return f.read(size)
+
+async def validate_media(path, file_extension):
+    head = await run_in_threadpool(_read_head, path, 12)
+
+    if not head:
+        raise HTTPException(status_code=400, detail="There were no files found")
+
+    if file_extension == ".wav":
+        if head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+            raise HTTPException(status_code=400, detail="Media is not a RIFF/WAVE file")
+        return
+
+    if not await run_in_threadpool(has_audio_stream, path):
+        raise HTTPException(status_code=400, detail="Media has no readable audio stream")
+
+def _load_json(path):
+    with open(path, "r", encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+async def validate_diarization(path):
+    try:
+        diarization_data = await run_in_threadpool(_load_json, path)
+    except Exception as e:
+        logger.error(f"Invalid diarization json {path}: {e}")
+        raise HTTPException(status_code=400, detail="Diarization file is not valid JSON")
+
+    if not isinstance(diarization_data, list) or not diarization_data:
+        raise HTTPException(status_code=400, detail="Diarization JSON must be a non-empty list of segments")
+
+    for segment in diarization_data:
+        if not isinstance(segment, dict) or "timestamp_ms" not in segment:
+            raise HTTPException(status_code=400, detail="Every diarization segment needs a timestamp_ms")
+
+    return diarization_data
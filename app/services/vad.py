@@ -0,0 +1,42 @@
+import numpy as np
+from app.config import VAD_FRAME_MS, VAD_THRESHOLD_DB, VAD_PADDING_MS, VAD_MIN_SPEECH_MS
+from app.services.chunk_store import SAMPLE_RATE
+
+def frame_size(frame_ms=VAD_FRAME_MS):
+    return max(1, SAMPLE_RATE * frame_ms // 1000)
+
+def frame_energy_db(audio, frame_ms=VAD_FRAME_MS):
+    frame = frame_size(frame_ms)
+    count = -(-len(audio) // frame)
+    if count == 0:
+        return np.empty(0, dtype=np.float32)
+
+    padded = np.zeros(count * frame, dtype=np.float32)
+    padded[:len(audio)] = audio
+    frames = padded.reshape(count, frame)
+
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+def voiced_bounds(audio, threshold_db=VAD_THRESHOLD_DB, padding_ms=VAD_PADDING_MS,
+                  min_speech_ms=VAD_MIN_SPEECH_MS, frame_ms=VAD_FRAME_MS):
+    # (start, end) sample range holding the speech, or None for silence.
+    voiced = np.flatnonzero(frame_energy_db(audio, frame_ms) > threshold_db)
+    if len(voiced) * frame_ms < min_speech_ms:
+        return None
+
+    frame = frame_size(frame_ms)
+    padding = SAMPLE_RATE * padding_ms // 1000
+    start = max(0, voiced[0] * frame - padding)
+    end = min(len(audio), (voiced[-1] + 1) * frame + padding)
+    return int(start), int(end)
+
+def find_pause(audio, low, high, frame_ms=VAD_FRAME_MS):
+    # Middle of the quietest frame in audio[low:high], latest one on ties.
+    energy = frame_energy_db(audio[low:high], frame_ms)
+    if len(energy) == 0:
+        return high
+
+    quietest = len(energy) - 1 - int(np.argmin(energy[::-1]))
+    frame = frame_size(frame_ms)
+    return min(high, low + quietest * frame + frame // 2)
@@ -5,73 +5,123 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 from app.services.redis_service import redis_client
-# from app.services.audio_extractor import extract_audio
 from app.services.consumer import consume_diarized_segments
+from app.services.chunk_store import remove_job_audio, SAMPLE_RATE
+from app.services.blob_store import blob_store
+from app.config import SPLITTER_ENQUEUE_BATCH, JOB_DEFAULT_PRIORITY, ALLOWED_MEDIA_EXTENSIONS
 from app.logger import get_logger
 
 logger = get_logger("worker-splitter")
 
+QUEUE_NAME = "queue:splitting"
+
+def split_job(task):
+    job_id = task["job_id"]
+    media_key = task["media_key"]
+    json_key = task["json_key"]
+    priority = int(task.get("priority") or JOB_DEFAULT_PRIORITY)
+
+    logger.info(f"Processing job: {job_id}")
+    logger.info(f"Cehcking media_key: {media_key}")
+    logger.info(f"View json_key: {json_key}")
+
+    started = time.monotonic()
+    queued_at = task.get("enqueued_at") or time.time()
+    redis_client.recordStages(job_id, {"splitting_queue": time.time() - queued_at}, queued_at=queued_at)
+
+    redis_client.statusUpdate(job_id, "processing_audio")
+
+    if os.path.splitext(media_key)[1].lower() not in ALLOWED_MEDIA_EXTENSIONS:
+        logger.error(f"Unsupported media type: {media_key}")
+
+        redis_client.statusUpdate(job_id, "failed", error="Unsupported media type")
+        return
+
+    redis_client.statusUpdate(job_id, "transcribing")
+
+    overall_chunks = 0
+    audio_samples = 0
+    pending = []
+    # With a remote store the media is fetched to local scratch once; the
+    # decoded PCM goes back to the store in parts.
+    with blob_store.local_copy(json_key) as json_path, blob_store.local_copy(media_key) as media_path:
+        for i in consume_diarized_segments(json_path, media_path, job_id):
+            payload = {
+                "job_id": job_id,
+                "chunk_index": i["chunk_index"],
+                "offset": i["offset"],
+                "num_samples": i["num_samples"],
+                "speaker": i["speaker"],
+                "start_ms": i["start"],
+                "duration_ms": i["duration_ms"],
+            }
+            logger.info(f"Payload: {payload}")
+
+            pending.append(payload)
+            overall_chunks += 1
+            audio_samples += i["num_samples"]
+
+            if len(pending) >= SPLITTER_ENQUEUE_BATCH:
+                redis_client.pushManyIntoQueue("queue:transcription", pending, priority)
+                redis_client.extendLease(QUEUE_NAME, task)
+                pending = []
+
+    redis_client.pushManyIntoQueue("queue:transcription", pending, priority)
+
+    logger.info(f"Job {job_id}: split into {overall_chunks} chunks")
+    redis_client.recordStages(
+        job_id, {"splitting": time.monotonic() - started}, audio_seconds=round(audio_samples / SAMPLE_RATE, 3)
+    )
+
+    if overall_chunks == 0:
+        redis_client.statusUpdate(job_id, "failed", error="segments not found")
+        remove_job_audio(job_id)
+        return
+
+    if redis_client.setTotalChunks(job_id, overall_chunks):
+        logger.info(f"Job {job_id}: all chunks already done, queued for summary")
+
+def fail_dead_task(task):
+    job_id = task["job_id"]
+    redis_client.statusUpdate(job_id, "failed", error="Splitting was retried too many times")
+    remove_job_audio(job_id)
+
 def run_splitter():
 
     print("Inside app.workers.splitter.py function")
 
+    redis_client.connect()
+
+    redis_client.onDeadLetter(QUEUE_NAME, fail_dead_task)
+
     while True:
         try:
-            task = redis_client.removeFromQueue("queue:splitting", timeout=0)
+            task = redis_client.reserveFromQueue(QUEUE_NAME, timeout=0)
             logger.info(f"Task from queue splitting - {task}")
+        except Exception as e:
+            logger.error(f"Splitter worker failed to reserve a task: {e}")
+            time.sleep(1)
+            continue
 
-            if not task:
-                continue
+        if not task:
+            continue
 
-            job_id = task["job_id"]
-            media_path = task["media_path"]
-            json_path = task["json_path"]
-
-            logger.info(f"Processing job: {job_id}")
-            logger.info(f"Cehcking media_path: {media_path}")
-            logger.info(f"View json_path: {json_path}")
-
-            redis_client.statusUpdate(job_id, "processing_audio")
-
-            if not media_path.lower().endswith(".wav"):
-                logger.error("Currenly only .wav audio files are supported.")
-
-                redis_client.statusUpdate(job_id, "failed", error="Only .wav files are allowed")
-                continue
-            
-            # audio_path = media_path
-            # if media_path.lower().endswith(".mp4"):
-            #     audio_path = media_path.replace(".mp4", ".wav")
-            #     extract_audio(media_path, audio_path)
-
-            segments = consume_diarized_segments(json_path, media_path)
-
-            overall_chunks = len(segments)
-            redis_client.statusUpdate(job_id, "transcribing", total_chunks=overall_chunks)
-            logger.info(f"Job {job_id}: split into {overall_chunks} chunks")
-
-            if overall_chunks == 0:
-                redis_client.statusUpdate(job_id, "failed", error="segments not found")
-                continue
-
-            for i in segments:
-                payload = {
-                    "job_id": job_id,
-                    "chunk_path": i["file_path"],
-                    "speaker": i["speaker"],
-                    "start_ms": i["start"],
-                    "duration_ms": i["duration_ms"],
-                }
-                logger.info(f"Payload: {payload}")
-
-                redis_client.pushIntoQueue("queue:transcription", payload)
+        try:
+            split_job(task)
         except Exception as e:
             logger.error(f"Splitter worker failed duw to: {e}")
 
-            if "job_id" in locals():
-                error = str(e)
-                redis_client.statusUpdate(job_id, "failed", error=error)
+            job_id = task["job_id"]
+            error = str(e)
+            redis_client.statusUpdate(job_id, "failed", error=error)
+            remove_job_audio(job_id)
 
             time.sleep(1)
 
-run_splitter()
\ No newline at end of file
+        try:
+            redis_client.ackTask(QUEUE_NAME, task)
+        except Exception as e:
+            logger.error(f"Splitter worker failed to ack task: {e}")
+
+if __name__ == "__main__":
+    run_splitter()
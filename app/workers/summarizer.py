@@ -2,90 +2,242 @@ import os
 import sys
 import json
 import time
+import uuid
+import asyncio
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
-from google import genai
 from app.services.redis_service import redis_client
+from app.services.chunk_store import remove_job_audio
+from app.services.summarizer import (
+    get_llm_client,
+    summarize_transcripts,
+    reduce_summaries,
+    combine_summaries,
+    llm_seconds,
+)
+from app.services.results import build_final_response
+from app.config import QUEUE_VISIBILITY_TIMEOUT, QUEUE_REAP_INTERVAL, SUMMARY_JOB_CONCURRENCY
 from app.logger import get_logger
-from app.config import GEMINI_API_KEY, GEMINI_MODEL_NAME, GEMINI_PROMPT_INSTRUCTION
 
 
 logger = get_logger("worker-summarizer")
 
-def check_gemini_api(GEMINI_API_KEY):
-    if not GEMINI_API_KEY:
-        logger.error("GEMINI_API_KEY is not set.")
-        return
-    logger.info(f"Gemini ai model anme: {GEMINI_MODEL_NAME}")
-    return genai.Client(api_key=GEMINI_API_KEY)
-
-
-def run_summarizer():
-
-    logger.info("Inside worker summariser")
-
-    client = check_gemini_api(GEMINI_API_KEY)
-
+QUEUE_NAME = "queue:summary"
+
+# Redis calls are short and blocking; they run on the default thread pool so
+# the event loop keeps LLM requests of other jobs moving.
+def redis_call(method, *args, **kwargs):
+    return asyncio.to_thread(method, *args, **kwargs)
+
+def job_lock(job_id):
+    return f"summary:{job_id}"
+
+def chunk_range(transcripts_list, start, end=None):
+    selected = []
+    for transcript in transcripts_list:
+        index = transcript.get("chunk_index")
+        if index is None:
+            # Fragments without an index can't be placed in a window, so
+            # only the final step picks them up.
+            if end is None:
+                selected.append(transcript)
+            continue
+        if index >= start and (end is None or index < end):
+            selected.append(transcript)
+    return selected
+
+async def keep_leased(task):
+    # Jobs now share the LLM budget, so one can outlive the visibility
+    # timeout while waiting for its turn. The job lock, once taken, is kept
+    # for as long as the lease so a partial and the final summary never
+    # overlap.
     while True:
+        await asyncio.sleep(QUEUE_VISIBILITY_TIMEOUT / 3)
         try:
-            task = redis_client.removeFromQueue("queue:summary", timeout=0)
+            await redis_call(redis_client.extendLease, QUEUE_NAME, task)
+            token = task.get("_lock_token")
+            if token and not await redis_call(redis_client.extendLock, job_lock(task["job_id"]), QUEUE_VISIBILITY_TIMEOUT, token):
+                logger.warning(f"Lost the summary lock of {task['job_id']}")
+        except Exception as e:
+            logger.warning(f"Couldn't extend lease for {task['job_id']}: {e}")
 
-            if not task:
-                continue
+async def acquire_job_lock(task):
+    token = uuid.uuid4().hex
+    if not await redis_call(redis_client.acquireLock, job_lock(task["job_id"]), QUEUE_VISIBILITY_TIMEOUT, token):
+        return False
+    task["_lock_token"] = token
+    return True
 
-            job_id = task["job_id"]
-            logger.info(f"Summarizing current job: {str(job_id)}")
+async def release_job_lock(task):
+    token = task.pop("_lock_token", None)
+    if token:
+        await redis_call(redis_client.releaseLock, job_lock(task["job_id"]), token)
 
-            transcripts_list = redis_client.getTranscripts(job_id)
+async def summarize_partial(client, task):
+    job_id = task["job_id"]
 
-            per_person = {}
-            for transcript in transcripts_list:
-                speaker = transcript["speaker"]
-                speaker_text = transcript["text"]
+    if not await acquire_job_lock(task):
+        logger.info(f"Job {job_id}: summary already in progress, skipping partial")
+        return
 
-                stripped_text = speaker_text.strip()
-                if stripped_text:
-                    if speaker not in per_person:
-                        per_person[speaker] = []
-                    per_person[speaker].append(speaker_text)
+    try:
+        job_info = await redis_call(redis_client.get_job_status, job_id)
+        if job_info.get("summary_queued"):
+            return
+
+        done_prefix = int(job_info.get("done_prefix") or 0)
+        summarized = int(job_info.get("summarized_chunks") or 0)
+        if done_prefix <= summarized:
+            return
+
+        logger.info(f"Job {job_id}: partial summary of chunks {summarized}-{done_prefix}")
+
+        started = time.monotonic()
+        spent = [0.0]
+        llm_seconds.set(spent)
+
+        transcripts_list = chunk_range(await redis_call(redis_client.getTranscripts, job_id), summarized, done_prefix)
+        partial = await summarize_transcripts(client, transcripts_list)
+
+        partials = await redis_call(redis_client.getPartialSummaries, job_id) + [partial]
+        await redis_call(redis_client.savePartialSummary, job_id, partial, done_prefix, combine_summaries(partials))
+
+        await redis_call(redis_client.recordStages, job_id, {
+            "partial_summarization": time.monotonic() - started,
+            "llm": spent[0],
+        })
+    finally:
+        await release_job_lock(task)
+
+async def summarize_job(client, task):
+    job_id = task["job_id"]
+    logger.info(f"Summarizing current job: {str(job_id)}")
+
+    summary_queue_seconds = time.time() - (task.get("enqueued_at") or time.time())
+
+    # Wait for a running partial summary so its window is not done twice.
+    while not await acquire_job_lock(task):
+        await asyncio.sleep(1)
+
+    started = time.monotonic()
+    spent = [0.0]
+    llm_seconds.set(spent)
+
+    try:
+        transcripts_list = await redis_call(redis_client.getTranscripts, job_id)
+        partials = await redis_call(redis_client.getPartialSummaries, job_id)
+
+        if partials:
+            job_info = await redis_call(redis_client.get_job_status, job_id)
+            summarized = int(job_info.get("summarized_chunks") or 0)
+            tail = chunk_range(transcripts_list, summarized)
+            logger.info(f"Job {job_id}: merging {len(partials)} partial summaries and {len(tail)} tail fragments")
+
+            if tail:
+                partials.append(await summarize_transcripts(client, tail))
+            summary_object = await reduce_summaries(client, partials)
+        else:
+            summary_object = await summarize_transcripts(client, transcripts_list)
+
+        await redis_call(redis_client.save_summary, job_id, summary_object)
+
+        final_response = build_final_response(job_id, summary_object, transcripts_list)
+        await redis_call(redis_client.saveFinalResult, job_id, json.dumps(final_response, ensure_ascii=False))
+
+        stages = {
+            "summary_queue": summary_queue_seconds,
+            "summarization": time.monotonic() - started,
+            "llm": spent[0],
+        }
+        queued_at = (await redis_call(redis_client.get_job_status, job_id)).get("queued_at")
+        if queued_at:
+            stages["total"] = time.time() - float(queued_at)
+        await redis_call(redis_client.recordStages, job_id, stages)
+
+        await redis_call(redis_client.statusUpdate, job_id, "complete")
+        await redis_call(remove_job_audio, job_id)
+    finally:
+        await release_job_lock(task)
+
+    logger.info(f"Job with id {job_id} completed")
+
+def fail_dead_task(task):
+    if task.get("mode") == "partial":
+        return
 
-            prompt_payload = {
-                "instruction": GEMINI_PROMPT_INSTRUCTION,
-                "per_person_transcripts": per_person
-            }
+    job_id = task["job_id"]
+    redis_client.statusUpdate(job_id, "failed", error="Summarizing was retried too many times")
+    remove_job_audio(job_id)
 
-            resp = client.models.generate_content(
-                model=GEMINI_MODEL_NAME,
-                contents=json.dumps(prompt_payload, ensure_ascii=False)
-            )
+async def handle_task(client, task):
+    lease_keeper = asyncio.create_task(keep_leased(task))
+    try:
+        if task.get("mode") == "partial":
+            try:
+                await summarize_partial(client, task)
+            except Exception as e:
+                # The final step summarizes whatever the partials missed.
+                logger.error(f"Partial summary failed for {task['job_id']}: {str(e)}")
+        else:
+            try:
+                await summarize_job(client, task)
+            except Exception as e:
+                logger.error(f"Summarizer worker failed: {str(e)}")
+
+                job_id = task["job_id"]
+                await redis_call(redis_client.statusUpdate, job_id, "failed", error=str(e))
+                await redis_call(remove_job_audio, job_id)
+    finally:
+        lease_keeper.cancel()
+
+    try:
+        await redis_call(redis_client.ackTask, QUEUE_NAME, task)
+    except Exception as e:
+        logger.error(f"Summarizer worker failed to ack task: {str(e)}")
+
+async def summarizer_loop():
+    await redis_call(redis_client.connect)
+
+    client = None
+    try:
+        client = get_llm_client()
+    except Exception as e:
+        logger.error(f"LLM client not available: {e}")
+    redis_client.onDeadLetter(QUEUE_NAME, fail_dead_task)
+
+    # Up to SUMMARY_JOB_CONCURRENCY jobs run at once; a new task is only
+    # reserved when a slot is free, so the rest stay on the queue for other
+    # summarizer processes.
+    slots = asyncio.Semaphore(max(1, SUMMARY_JOB_CONCURRENCY))
+    running = set()
 
-            summary_text = getattr(resp, "text", "")
+    while True:
+        await slots.acquire()
 
-            try:
-                summary_object = json.loads(summary_text)
-            except Exception:
+        try:
+            # A bounded wait keeps the pool thread joinable on shutdown.
+            task = await redis_call(redis_client.reserveFromQueue, QUEUE_NAME, timeout=QUEUE_REAP_INTERVAL * 2)
+        except Exception as e:
+            logger.error(f"Summarizer worker failed to reserve a task: {str(e)}")
+            slots.release()
+            await asyncio.sleep(1)
+            continue
 
-                try:
-                    a = summary_text.find("{")
-                    b = summary_text.rfind("}")
-                    if a != -1 and b != -1:
-                        summary_object = json.loads(summary_text[a:b + 1])
-                    else:
-                        summary_object = {"raw": summary_text}
-                except Exception:
-                    summary_object = {"raw": summary_text}
+        if not task:
+            slots.release()
+            continue
 
-            redis_client.save_summary(job_id, summary_object)
-            redis_client.statusUpdate(job_id, "complete")
+        job = asyncio.create_task(handle_task(client, task))
+        running.add(job)
+        job.add_done_callback(running.discard)
+        job.add_done_callback(lambda void: slots.release())
 
-            logger.info(f"Job with id {job_id} completed")
+def run_summarizer():
 
-        except Exception as e:
-            logger.error(f"Summarizer worker failed: {str(e)}")
-            
-            if 'job_id' in locals():
-                redis_client.statusUpdate(job_id, "failed", error=str(e))
-            time.sleep(1)
+    logger.info("Inside worker summariser")
+
+    asyncio.run(summarizer_loop())
 
-run_summarizer()
+if __name__ == "__main__":
+    run_summarizer()
@@ -0,0 +1,29 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.services.redis_service import redis_client
+from app.services.retention import sweep_once
+from app.config import RETENTION_SWEEP_INTERVAL
+from app.logger import get_logger
+
+logger = get_logger("worker-sweeper")
+
+def run_sweeper():
+
+    redis_client.connect()
+
+    while True:
+        try:
+            stats = sweep_once()
+            if any(stats.values()):
+                logger.info(f"Retention sweep removed: {stats}")
+        except Exception as e:
+            logger.exception(f"Retention sweep failed: {e}")
+
+        time.sleep(RETENTION_SWEEP_INTERVAL)
+
+if __name__ == "__main__":
+    run_sweeper()
@@ -5,7 +5,9 @@ import time
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
 from app.services.redis_service import redis_client
-from app.services.transcriber import transcribe_audio, load_model
+from app.services.transcriber import transcribe_chunks, get_model_pool
+from app.services.chunk_store import read_chunk
+from app.config import TRANSCRIBE_BATCH_SIZE, TRANSCRIBE_BATCH_WAIT_MS
 from app.logger import get_logger
 
 
@@ -13,66 +15,81 @@ from app.logger import get_logger
 logger = get_logger("worker-transcriber")
 logger.info("Inside workers.transcriber function")
 
+QUEUE_NAME = "queue:transcription"
+
+def complete_chunks(tasks, texts):
+    results = []
+    for task, text in zip(tasks, texts):
+        chunk_data = {}
+        chunk_data["speaker"] = task["speaker"]
+        chunk_data["text"] = text
+        chunk_data["timestamp_ms"] = task.get("start_ms")
+        chunk_data["chunk_index"] = task.get("chunk_index")
+        results.append((task["job_id"], task.get("chunk_index"), chunk_data))
+
+    for job_id, processed, summary_queued in redis_client.completeChunks(results):
+        if summary_queued:
+            logger.info(f"Job {job_id}: all {processed} chunks done, queued for summary")
+
+def skip_dead_chunk(task):
+    # A chunk that keeps killing workers is recorded as silent so the rest
+    # of its job can still finish.
+    complete_chunks([task], [""])
+
 def run_transcriber():
 
-    m = load_model()
+    redis_client.connect()
 
-    if m is None:
-        logger.info("no model loaded")
+    try:
+        get_model_pool().preload()
+    except Exception as e:
+        logger.exception(f"no model loaded: {e}")
         time.sleep(1)
 
+    redis_client.onDeadLetter(QUEUE_NAME, skip_dead_chunk)
+
     while True:
 
-        task = None
+        tasks = []
 
         try:
-            task_name = "queue:transcription"
-            task = redis_client.removeFromQueue(task_name, timeout=0)
+            tasks = redis_client.reserveManyFromQueue(
+                QUEUE_NAME, TRANSCRIBE_BATCH_SIZE, wait_ms=TRANSCRIBE_BATCH_WAIT_MS, timeout=0
+            )
         except Exception as e:
             logger.exception(f"Error on processing queue: {e}")
             time.sleep(1)
 
-        if not task:
+        if not tasks:
             time.sleep(0.01)
             continue
 
-        job_id = task["job_id"]
-        chunk_path = task["chunk_path"]
-        speaker = task["speaker"]
-
+        started = time.monotonic()
         try:
-            text = transcribe_audio(chunk_path)
+            chunks = []
+            for task in tasks:
+                chunks.append(read_chunk(task["job_id"], task["offset"], task["num_samples"]))
+
+            texts, transcribed = transcribe_chunks(chunks)
         except Exception as e:
             logger.exception(f"Error while transcribing chunks: {e}")
-            text = ""
-
-        chunk_data = {}
-        chunk_data["speaker"] = speaker
-        chunk_data["text"] = text
-        chunk_data["timestamp_ms"] = task.get("start_ms")
+            texts, transcribed = [""] * len(tasks), []
+        elapsed = time.monotonic() - started
 
         try:
-            redis_client.saveTranscriptsFromChunks(job_id, chunk_data)
-            new_count = redis_client.increment_processed_count(job_id)
+            complete_chunks(tasks, texts)
+            redis_client.ackTasks(QUEUE_NAME, tasks)
 
         except Exception as e:
             logger.exception(f"Couldn't save chunks: {e}")
             continue
 
-        job_info = redis_client.get_job_status(job_id)
-        total_chunks = job_info.get("total_chunks")
-
-        if not total_chunks:
-            total_chunks = 0
-        
-        total_chunks = int(total_chunks)
-    
-        if new_count >= total_chunks and total_chunks != 0:
-            try:
-                redis_client.statusUpdate(job_id, "summarizing")
-                redis_client.pushIntoQueue("queue:summary", {"job_id": job_id})
-            except Exception as e:
-                logger.exception(f"Cant push summar into redis: {e}")
+        try:
+            redis_client.recordTranscription(tasks, elapsed, [tasks[position] for position in transcribed])
+        except Exception as e:
+            logger.warning(f"Couldn't record transcription metrics: {e}")
+
         time.sleep(0.001)
 
-run_transcriber()
\ No newline at end of file
+if __name__ == "__main__":
+    run_transcriber()
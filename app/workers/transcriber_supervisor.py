@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import signal
+import multiprocessing
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.config import TRANSCRIBER_PROCESSES, TRANSCRIBER_THREADS_PER_PROCESS
+from app.services.transcriber import get_model_pool, backend_class
+from app.logger import get_logger
+
+logger = get_logger("worker-transcriber-supervisor")
+
+MIN_UPTIME_SECONDS = 10
+MAX_RESTART_BACKOFF_SECONDS = 60
+
+def physical_core_count():
+    cores = set()
+    physical_id = core_id = None
+
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith("physical id"):
+                    physical_id = line.split(":", 1)[1].strip()
+                elif line.startswith("core id"):
+                    core_id = line.split(":", 1)[1].strip()
+                elif not line.strip():
+                    if core_id is not None:
+                        cores.add((physical_id, core_id))
+                    physical_id = core_id = None
+        if core_id is not None:
+            cores.add((physical_id, core_id))
+    except OSError:
+        pass
+
+    available = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    if not cores:
+        return available
+    return max(1, min(len(cores), available))
+
+def run_child(index, threads):
+    # The parent's signal handlers are inherited through fork.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    # Read by CTranslate2 when the child loads its own faster-whisper model.
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+
+    import torch
+    torch.set_num_threads(threads)
+
+    from app.workers.transcriber import run_transcriber
+
+    logger.info(f"Transcriber {index} started, pid {os.getpid()}, {threads} torch threads")
+    run_transcriber()
+
+class Child:
+    def __init__(self, context, index, threads):
+        self.context = context
+        self.index = index
+        self.threads = threads
+        self.failures = 0
+        self.restart_at = 0
+        self.process = None
+
+    def start(self):
+        self.process = self.context.Process(
+            target=run_child, args=(self.index, self.threads), name=f"transcriber-{self.index}"
+        )
+        self.process.start()
+        self.started_at = time.monotonic()
+
+    def check(self):
+        if self.process is not None and self.process.is_alive():
+            return
+
+        now = time.monotonic()
+        if self.process is not None:
+            logger.error(f"Transcriber {self.index} exited with code {self.process.exitcode}")
+
+            # Children that die right after starting back off exponentially
+            # so a broken setup does not fork in a tight loop.
+            if now - self.started_at < MIN_UPTIME_SECONDS:
+                self.failures += 1
+            else:
+                self.failures = 0
+            self.restart_at = now + min(MAX_RESTART_BACKOFF_SECONDS, 2 ** self.failures - 1)
+            self.process = None
+
+        if now >= self.restart_at:
+            self.start()
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+
+    def join(self, timeout):
+        if self.process is None:
+            return
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+def run_supervisor():
+
+    cores = physical_core_count()
+    processes = TRANSCRIBER_PROCESSES or cores
+    threads = TRANSCRIBER_THREADS_PER_PROCESS or max(1, cores // processes)
+    logger.info(f"Starting {processes} transcribers x {threads} threads on {cores} physical cores")
+
+    # Loaded once here so every forked child shares the weights copy-on-write.
+    if backend_class().fork_safe:
+        get_model_pool().preload()
+
+    context = multiprocessing.get_context("fork")
+    children = [Child(context, index, threads) for index in range(processes)]
+    for child in children:
+        child.start()
+
+    stopping = []
+    def stop(signum, frame):
+        logger.info(f"Supervisor received signal {signum}, stopping transcribers")
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        for child in children:
+            child.check()
+        time.sleep(1)
+
+    for child in children:
+        child.stop()
+    for child in children:
+        child.join(timeout=10)
+
+if __name__ == "__main__":
+    run_supervisor()
@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Local stand-in for the Gemini generateContent endpoint, for exercising the
+# summarizer's concurrency, rate limiting and retries without a real key.
+# Point the summarizer at it with GEMINI_BASE_URL=http://127.0.0.1:8089.
+#
+#   python benchmarks/fake_llm_server.py --latency 0.5 --error-rate 0.05 --rpm 120
+
+class FakeLLM:
+    def __init__(self, latency=0.2, jitter=0.1, error_rate=0.0, rpm=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.window = []
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def admit(self):
+        # Sliding one-minute window, like the per-minute quota of the real API.
+        now = time.monotonic()
+        with self.lock:
+            self.stats["requests"] += 1
+            self.window = [t for t in self.window if now - t < 60]
+            if self.rpm and len(self.window) >= self.rpm:
+                self.stats["rate_limited"] += 1
+                return max(1, int(60 - (now - self.window[0])) + 1)
+            self.window.append(now)
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+        return None
+
+    def finish(self, ok):
+        with self.lock:
+            self.stats["in_flight"] -= 1
+            self.stats["ok" if ok else "errors"] += 1
+
+
+def error_body(code, status, message):
+    return {"error": {"code": code, "status": status, "message": message}}
+
+def create_app(fake):
+    from app.services.summarizer import stub_reply
+
+    app = FastAPI()
+
+    @app.post("/{version}/models/{model}:generateContent")
+    async def generate_content(version: str, model: str, request: Request):
+        retry_after = fake.admit()
+        if retry_after:
+            return JSONResponse(
+                error_body(429, "RESOURCE_EXHAUSTED", "Quota exceeded"),
+                status_code=429,
+                headers={"Retry-After": str(retry_after)},
+            )
+
+        ok = False
+        try:
+            await asyncio.sleep(max(0.0, fake.latency + random.uniform(-fake.jitter, fake.jitter)))
+            if random.random() < fake.error_rate:
+                return JSONResponse(error_body(503, "UNAVAILABLE", "The model is overloaded"), status_code=503)
+
+            body = await request.json()
+            prompt = "".join(
+                part.get("text", "")
+                for content in body.get("contents", [])
+                for part in content.get("parts", [])
+            )
+            text = stub_reply(prompt)
+            ok = True
+        finally:
+            fake.finish(ok)
+
+        prompt_tokens = len(prompt) // 4
+        output_tokens = len(text) // 4
+        return {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+            "modelVersion": model,
+        }
+
+    @app.get("/stats")
+    async def stats():
+        with fake.lock:
+            return dict(fake.stats)
+
+    return app
+
+def serve_in_thread(fake, host="127.0.0.1", port=8089):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="fake-llm", daemon=True)
+    thread.start()
+
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="mean seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before 429s, 0 = unlimited")
+    args = parser.parse_args()
+
+    fake = FakeLLM(args.latency, args.jitter, args.error_rate, args.rpm)
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
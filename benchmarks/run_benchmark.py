@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.synthetic import write_meeting
+
+# End-to-end benchmark: synthetic meetings go through POST /jobs, the
+# splitter, transcriber and summarizer workers (as threads in this process)
+# and GET /jobs/{id}, against fakeredis or a real Redis, with the stub ASR
+# and LLM backends so only the pipeline itself is measured.
+#
+#   python benchmarks/run_benchmark.py --minutes 5,30 --jobs 4 --speakers 3
+#   python benchmarks/run_benchmark.py --redis-host localhost --asr-rtf 0.05
+#   python benchmarks/run_benchmark.py --fake-llm --llm-latency 1 --llm-rpm 120 --llm-error-rate 0.1
+#
+# --fake-llm swaps the stub LLM for the real Gemini client pointed at
+# benchmarks/fake_llm_server.py, so rate limiting and retries are exercised.
+
+NON_STAGE_FIELDS = ("audio_seconds", "transcribed_audio_seconds")
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", default="5", help="comma-separated meeting lengths")
+    parser.add_argument("--jobs", type=int, default=2, help="meetings per length")
+    parser.add_argument("--speakers", type=int, default=3)
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--splitters", type=int, default=1)
+    parser.add_argument("--transcribers", type=int, default=2)
+    parser.add_argument("--summarizers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--asr-rtf", type=float, default=0.0, help="simulated ASR seconds per audio second")
+    parser.add_argument("--fake-llm", action="store_true", help="summarize through a local fake Gemini server")
+    parser.add_argument("--llm-port", type=int, default=8089)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rpm", type=int, default=0, help="fake server quota, 0 = unlimited")
+    parser.add_argument("--cache", action="store_true", help="keep the result cache enabled")
+    parser.add_argument("--redis-host", help="use this Redis instead of fakeredis (its data is not cleared)")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=1800)
+    parser.add_argument("--json", dest="json_path", help="also write the report here")
+    return parser.parse_args()
+
+def configure(args, data_dir):
+    # Must run before anything under app/ is imported: config is read once.
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["ASR_BACKEND"] = "stub"
+    os.environ["ASR_STUB_RTF"] = str(args.asr_rtf)
+    os.environ["SUMMARY_LLM_BACKEND"] = "stub"
+    if args.fake_llm:
+        os.environ["SUMMARY_LLM_BACKEND"] = "gemini"
+        os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{args.llm_port}"
+        os.environ.setdefault("GEMINI_API_KEY", "fake")
+        os.environ.setdefault("SUMMARY_LLM_BACKOFF_MAX", "5")
+    os.environ["CACHE_ENABLED"] = "true" if args.cache else "false"
+    os.environ["TRANSCRIBE_BATCH_SIZE"] = str(args.batch_size)
+    os.environ["WHISPER_POOL_SIZE"] = str(args.transcribers)
+    os.environ["QUEUE_REAP_INTERVAL"] = "0.5"
+    # Every job is submitted at once; ADMISSION_ENABLED=true measures how
+    # many of that burst admission control would refuse.
+    os.environ.setdefault("ADMISSION_ENABLED", "false")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    if args.redis_host:
+        os.environ["REDIS_HOST"] = args.redis_host
+        os.environ["REDIS_PORT"] = str(args.redis_port)
+    else:
+        use_fakeredis()
+
+def use_fakeredis():
+    try:
+        import fakeredis
+        import fakeredis.aioredis
+    except ImportError:
+        sys.exit("fakeredis is not installed: pip install 'fakeredis[lua]', or pass --redis-host")
+
+    import redis
+    import redis.asyncio
+
+    # One in-memory server shared by the API's async client and the workers.
+    server = fakeredis.FakeServer()
+
+    def sync_client(*args, **kwargs):
+        return fakeredis.FakeRedis(server=server, decode_responses=kwargs.get("decode_responses", True))
+
+    def async_client(*args, **kwargs):
+        pool = kwargs.get("connection_pool")
+        decode_responses = pool.connection_kwargs.get("decode_responses", True) if pool else True
+        return fakeredis.aioredis.FakeRedis(server=server, decode_responses=decode_responses)
+
+    redis.Redis = sync_client
+    redis.asyncio.Redis = async_client
+
+def percentiles(values):
+    import numpy as np
+
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(max(values)), "n": len(values)}
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def make_meetings(args, input_dir):
+    meetings = []
+    seed = 0
+    for minutes in [float(m) for m in args.minutes.split(",") if m]:
+        for void in range(args.jobs):
+            wav_path = os.path.join(input_dir, f"meeting_{seed}.wav")
+            json_path = os.path.join(input_dir, f"meeting_{seed}.json")
+            turns = write_meeting(wav_path, json_path, minutes * 60, args.speakers, args.sample_rate, seed)
+            meetings.append({"wav_path": wav_path, "json_path": json_path, "minutes": minutes, "turns": turns})
+            seed += 1
+    return meetings
+
+def start_workers(args):
+    from app.workers.splitter import run_splitter
+    from app.workers.transcriber import run_transcriber
+    from app.workers.summarizer import run_summarizer
+
+    workers = (
+        [run_splitter] * args.splitters
+        + [run_transcriber] * args.transcribers
+        + [run_summarizer] * args.summarizers
+    )
+    for target in workers:
+        threading.Thread(target=target, name=target.__name__, daemon=True).start()
+
+def start_fake_llm(args):
+    from benchmarks.fake_llm_server import FakeLLM, serve_in_thread
+
+    fake = FakeLLM(latency=args.llm_latency, error_rate=args.llm_error_rate, rpm=args.llm_rpm)
+    serve_in_thread(fake, port=args.llm_port)
+    return fake
+
+def run(args, meetings):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services.redis_service import redis_client
+
+    fake_llm = start_fake_llm(args) if args.fake_llm else None
+    start_workers(args)
+
+    submit_ms = []
+    status_ms = []
+    jobs = {}
+    rejected = 0
+
+    with TestClient(app) as client:
+        started = time.perf_counter()
+
+        for meeting in meetings:
+            with open(meeting["wav_path"], "rb") as media, open(meeting["json_path"], "rb") as diarization:
+                t0 = time.perf_counter()
+                resp = client.post("/jobs", files={
+                    "file": ("meeting.wav", media, "audio/wav"),
+                    "diarization_json": ("diarization.json", diarization, "application/json"),
+                })
+                submit_ms.append((time.perf_counter() - t0) * 1000)
+            if resp.status_code == 429:
+                rejected += 1
+                continue
+            resp.raise_for_status()
+            jobs[resp.json()["job_id"]] = dict(meeting, submitted=time.perf_counter())
+
+        pending = set(jobs)
+        deadline = time.perf_counter() + args.timeout
+        while pending and time.perf_counter() < deadline:
+            for job_id in list(pending):
+                t0 = time.perf_counter()
+                resp = client.get(f"/jobs/{job_id}")
+                status_ms.append((time.perf_counter() - t0) * 1000)
+
+                status = resp.json().get("status")
+                if status in ("complete", "failed"):
+                    jobs[job_id]["status"] = status
+                    jobs[job_id]["finished"] = time.perf_counter()
+                    pending.discard(job_id)
+            time.sleep(args.poll_interval)
+
+        wall = time.perf_counter() - started
+
+        t0 = time.perf_counter()
+        client.get("/metrics").raise_for_status()
+        metrics_ms = (time.perf_counter() - t0) * 1000
+
+    stages = {}
+    for job_id in jobs:
+        for field, value in redis_client.get_job_status(job_id).items():
+            if field.endswith("_seconds") and field not in NON_STAGE_FIELDS:
+                stages.setdefault(field[:-len("_seconds")], []).append(float(value))
+
+    finished = [job for job in jobs.values() if "finished" in job]
+    audio_minutes = sum(job["minutes"] for job in finished)
+    counters = redis_client.client.hgetall("metrics:counters")
+
+    report = {
+        "jobs": len(jobs),
+        "rejected": rejected,
+        "completed": sum(1 for job in finished if job["status"] == "complete"),
+        "failed": sum(1 for job in finished if job["status"] == "failed"),
+        "timed_out": len(pending),
+        "wall_seconds": wall,
+        "audio_minutes": audio_minutes,
+        "realtime_factor": audio_minutes * 60 / wall if wall else 0,
+        "jobs_per_minute": len(finished) * 60 / wall if wall else 0,
+        "chunks_per_second": float(counters.get("chunks_transcribed", 0)) / wall if wall else 0,
+        "end_to_end_seconds": percentiles([job["finished"] - job["submitted"] for job in finished]),
+        "stage_seconds": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        "api_ms": {
+            "submit": percentiles(submit_ms),
+            "status": percentiles(status_ms),
+            "metrics": {"p50": metrics_ms, "n": 1},
+        },
+    }
+    if fake_llm:
+        report["fake_llm"] = dict(fake_llm.stats)
+    return report
+
+def print_report(report):
+    print(f"\njobs {report['jobs']}: {report['completed']} complete, {report['failed']} failed, "
+          f"{report['timed_out']} timed out, {report['rejected']} rejected")
+    print(f"{report['audio_minutes']:.1f} audio minutes in {report['wall_seconds']:.1f}s "
+          f"({report['realtime_factor']:.1f}x realtime, {report['jobs_per_minute']:.1f} jobs/min, "
+          f"{report['chunks_per_second']:.1f} chunks/s)")
+    print(f"peak RSS {report['peak_rss_mb']:.0f} MB (before run {report['rss_before_mb']:.0f} MB)")
+    if "fake_llm" in report:
+        llm = report["fake_llm"]
+        print(f"fake LLM: {llm['requests']} requests, {llm['ok']} ok, {llm['rate_limited']} rate limited, "
+              f"{llm['errors']} errors, {llm['max_in_flight']} max in flight")
+    print()
+
+    rows = [("end_to_end", report["end_to_end_seconds"], "s")]
+    rows += [(stage, values, "s") for stage, values in report["stage_seconds"].items()]
+    rows += [(f"api {name}", values, "ms") for name, values in report["api_ms"].items()]
+
+    print(f"{'':26}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'n':>7}")
+    for name, values, unit in rows:
+        cells = "".join(f"{values[key]:>10.3f}" if key in values else f"{'-':>10}" for key in ("p50", "p95", "p99", "max"))
+        print(f"{name + ' (' + unit + ')':26}{cells}{values.get('n', 0):>7}")
+
+def main():
+    args = parse_args()
+    data_dir = tempfile.mkdtemp(prefix="polygraf-bench-")
+    input_dir = os.path.join(data_dir, "inputs")
+    os.makedirs(input_dir)
+
+    try:
+        configure(args, data_dir)
+        meetings = make_meetings(args, input_dir)
+        rss_before = peak_rss_mb()
+
+        report = run(args, meetings)
+        report["rss_before_mb"] = rss_before
+        report["peak_rss_mb"] = peak_rss_mb()
+        report["args"] = vars(args)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as json_file:
+            json.dump(report, json_file, indent=2)
+
+if __name__ == "__main__":
+    main()
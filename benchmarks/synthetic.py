@@ -0,0 +1,90 @@
+import json
+import wave
+import argparse
+import numpy as np
+
+# Synthetic meetings: each speaker is a voice-like tone at its own pitch,
+# turns of random length are separated by short silences, and the
+# diarization JSON matches the audio exactly.
+
+ANCHOR_MS = 1_700_000_000_000
+
+def plan_turns(duration_s, speakers, seed=0, min_turn_s=2.0, max_turn_s=25.0):
+    rng = np.random.default_rng(seed)
+    turns = []
+    position_ms = 0
+    speaker = 0
+    total_ms = int(duration_s * 1000)
+
+    while position_ms < total_ms:
+        length_ms = int(rng.uniform(min_turn_s, max_turn_s) * 1000)
+        length_ms = min(length_ms, total_ms - position_ms)
+        if length_ms <= 0:
+            break
+        turns.append((speaker, position_ms, length_ms))
+
+        position_ms += length_ms + int(rng.uniform(0.2, 1.5) * 1000)
+        # Mostly alternate, sometimes the same speaker keeps going.
+        if speakers > 1 and rng.random() > 0.2:
+            speaker = (speaker + int(rng.integers(1, speakers))) % speakers
+
+    return turns
+
+def speech_like(length, pitch, sample_rate, rng):
+    t = np.arange(length) / sample_rate
+    # A pitched tone with syllable-rate amplitude modulation and a little noise.
+    envelope = 0.55 + 0.45 * np.sin(2 * np.pi * 4.0 * t + rng.uniform(0, np.pi))
+    signal = np.sin(2 * np.pi * pitch * t) + 0.3 * np.sin(2 * np.pi * 2 * pitch * t)
+    return (0.25 * envelope * signal + 0.01 * rng.standard_normal(length)).astype(np.float32)
+
+def write_meeting(wav_path, json_path, duration_s=600, speakers=3, sample_rate=16000, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    turns = plan_turns(duration_s, speakers, seed)
+    pitches = [110 + 35 * index for index in range(speakers)]
+    total_samples = int(duration_s * sample_rate)
+
+    with wave.open(wav_path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+
+        # Written turn by turn so hour-long meetings never sit in memory.
+        written = 0
+        for speaker, start_ms, length_ms in turns:
+            start = start_ms * sample_rate // 1000
+            length = length_ms * sample_rate // 1000
+            silence = np.zeros(start - written, dtype=np.float32)
+            voice = speech_like(length, pitches[speaker], sample_rate, rng)
+            for block in (silence, voice):
+                wav_file.writeframes((np.clip(block, -1, 1) * 32767).astype("<i2").tobytes())
+            written = start + length
+        wav_file.writeframes(np.zeros(max(0, total_samples - written), dtype="<i2").tobytes())
+
+    diarization = []
+    for speaker, start_ms, length_ms in turns:
+        diarization.append({
+            "speaker_name": f"Speaker {speaker + 1}",
+            "timestamp_ms": ANCHOR_MS + start_ms,
+            "duration_ms": length_ms,
+            "transcription": {"transcript": ""},
+        })
+    with open(json_path, "w", encoding="utf-8") as json_file:
+        json.dump(diarization, json_file)
+
+    return len(turns)
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic meeting WAV and diarization JSON")
+    parser.add_argument("wav_path")
+    parser.add_argument("json_path")
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--speakers", type=int, default=3)
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    turns = write_meeting(args.wav_path, args.json_path, args.minutes * 60, args.speakers, args.sample_rate, args.seed)
+    print(f"{args.wav_path}: {args.minutes} min, {args.speakers} speakers, {turns} turns")
+
+if __name__ == "__main__":
+    main()
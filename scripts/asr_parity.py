@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import uuid
+import argparse
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.consumer import consume_diarized_segments
+from app.services.chunk_store import read_chunk, remove_job_audio
+from app.services.transcriber import load_model, backend_cache_id
+from app.config import WHISPER_MODEL
+
+# Compares two ASR backends on the same diarized meeting and fails when their
+# transcripts drift apart by more than --max-wer.
+#
+#   python scripts/asr_parity.py data/audio.wav data/diarization.json \
+#       --reference whisper --candidate faster-whisper
+#
+# With --batch N the candidate is the reference backend's own batched mode,
+# N chunks per call, plus a silent chunk, where Whisper's no-speech skip must agree exactly.
+
+def normalize(text):
+    words = "".join(c.lower() if c.isalnum() or c.isspace() else " " for c in text)
+    return words.split()
+
+def word_error_rate(reference, hypothesis):
+    reference = normalize(reference)
+    hypothesis = normalize(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            )
+        previous = current
+    return previous[-1] / len(reference)
+
+def transcribe_all(model, chunks, batch_size=0):
+    started = time.perf_counter()
+    if batch_size:
+        texts = []
+        for i in range(0, len(chunks), batch_size):
+            texts.extend(model.transcribe_batch(chunks[i:i + batch_size]))
+    else:
+        texts = [model.transcribe(chunk) for chunk in chunks]
+    return texts, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("audio_path")
+    parser.add_argument("json_path")
+    parser.add_argument("--model", default=WHISPER_MODEL)
+    parser.add_argument("--reference", default="whisper")
+    parser.add_argument("--candidate", default="faster-whisper")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--max-wer", type=float, default=0.15)
+    parser.add_argument("--batch", type=int, default=0)
+    args = parser.parse_args()
+
+    job_id = f"asr-parity-{uuid.uuid4()}"
+    try:
+        segments = list(consume_diarized_segments(args.json_path, args.audio_path, job_id))
+        segments = [s for s in segments if s["num_samples"] > 0]
+        if args.limit:
+            segments = segments[:args.limit]
+
+        chunks = [read_chunk(job_id, s["offset"], s["num_samples"]) for s in segments]
+        labels = [f"chunk {s['chunk_index']}" for s in segments]
+    finally:
+        remove_job_audio(job_id)
+
+    if args.batch:
+        chunks.append(np.zeros(5 * 16000, dtype=np.float32))
+        labels.append("silence")
+        reference_model = load_model(args.model, args.reference)
+        candidate_model = reference_model
+        candidate_name = f"{backend_cache_id(args.model, args.reference)} batch={args.batch}"
+    else:
+        reference_model = load_model(args.model, args.reference)
+        candidate_model = load_model(args.model, args.candidate)
+        candidate_name = backend_cache_id(args.model, args.candidate)
+
+    reference, reference_seconds = transcribe_all(reference_model, chunks)
+    candidate, candidate_seconds = transcribe_all(candidate_model, chunks, args.batch)
+
+    failed = False
+    total_words = 0
+    total_errors = 0.0
+    for label, ref_text, cand_text in zip(labels, reference, candidate):
+        if label == "silence":
+            if ref_text != cand_text:
+                failed = True
+                print("silence differs")
+                print(f"  reference: {ref_text}")
+                print(f"  candidate: {cand_text}")
+            continue
+
+        wer = word_error_rate(ref_text, cand_text)
+        words = len(normalize(ref_text))
+        total_words += words
+        total_errors += wer * max(words, 1)
+        if wer > args.max_wer:
+            print(f"{label} wer={wer:.2f}")
+            print(f"  reference: {ref_text}")
+            print(f"  candidate: {cand_text}")
+
+    overall = total_errors / max(total_words, 1)
+    audio_seconds = sum(s["num_samples"] for s in segments) / 16000
+    print(f"{len(segments)} chunks, {audio_seconds:.1f}s of audio")
+    print(f"{backend_cache_id(args.model, args.reference)}: {reference_seconds:.1f}s")
+    print(f"{candidate_name}: {candidate_seconds:.1f}s "
+          f"({reference_seconds / max(candidate_seconds, 1e-9):.1f}x)")
+    print(f"word error rate vs reference: {overall:.3f} (max {args.max_wer})")
+
+    sys.exit(0 if overall <= args.max_wer and not failed else 1)
+
+if __name__ == "__main__":
+    main()
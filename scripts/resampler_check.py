@@ -0,0 +1,72 @@
+import os
+import sys
+import argparse
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.consumer import StreamingResampler
+from app.services.chunk_store import SAMPLE_RATE
+
+# Feeds a ramp through StreamingResampler in uneven blocks and fails when the
+# output length or alignment differs from resampling it in one piece, or
+# from where each output sample should fall in the source.
+#
+#   python scripts/resampler_check.py --rates 44100 22050 48000 8000
+
+BLOCK_SIZES = (1001, 1, 4096, 37, 160, 2, 999)
+
+def resample(source_rate, samples, block_sizes):
+    resampler = StreamingResampler(source_rate)
+    pieces = []
+    position = 0
+    i = 0
+    while position < len(samples):
+        size = block_sizes[i % len(block_sizes)]
+        pieces.append(resampler.process(samples[position:position + size]))
+        position += size
+        i += 1
+    return np.concatenate(pieces)
+
+def check_rate(source_rate, seconds):
+    # A ramp's value is its own index, so each output sample says which
+    # source position it came from.
+    ramp = np.arange(source_rate * seconds, dtype=np.float64)
+    whole = resample(source_rate, ramp, (len(ramp),))
+    blocked = resample(source_rate, ramp, BLOCK_SIZES)
+
+    expected_len = int((len(ramp) - 1) * SAMPLE_RATE // source_rate) + 1
+    if source_rate % SAMPLE_RATE == 0:
+        factor = source_rate // SAMPLE_RATE
+        expected = ramp[:len(ramp) - len(ramp) % factor].reshape(-1, factor).mean(axis=1)
+    elif source_rate == SAMPLE_RATE:
+        expected = ramp
+    else:
+        expected = np.arange(expected_len) * (source_rate / SAMPLE_RATE)
+
+    errors = []
+    for name, output in (("whole", whole), ("blocked", blocked)):
+        if len(output) != len(expected):
+            errors.append(f"{name}: {len(output)} samples, expected {len(expected)}")
+            continue
+        drift = np.max(np.abs(output.astype(np.float64) - expected))
+        # float32 output can't hold ramp values exactly.
+        if drift > max(1.0, expected[-1] * 1e-6):
+            errors.append(f"{name}: off by up to {drift:.1f} source samples")
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Check StreamingResampler alignment on a ramp")
+    parser.add_argument("--rates", type=int, nargs="+", default=[44100, 22050, 48000, 32000, 8000, 11025, 16000])
+    parser.add_argument("--seconds", type=int, default=10)
+    args = parser.parse_args()
+
+    failed = False
+    for rate in args.rates:
+        errors = check_rate(rate, args.seconds)
+        print(f"{rate} Hz: {'ok' if not errors else '; '.join(errors)}")
+        failed = failed or bool(errors)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
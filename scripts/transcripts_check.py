@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.services.transcripts import pack_transcript, unpack_legacy_transcripts, merge_transcripts
+
+# Reads legacy job:<id>:transcripts records, in the shape jobs written before
+# per-speaker sets stored them, together with per-speaker records, and fails
+# unless they come back merged in time order with filters applied.
+#
+#   python scripts/transcripts_check.py
+
+def legacy_record(speaker, text, timestamp_ms, **extra):
+    # Baseline records have no chunk_index.
+    return json.dumps({"speaker": speaker, "text": text, "timestamp_ms": timestamp_ms, **extra}).encode()
+
+def check():
+    legacy = [
+        legacy_record("Alice", "hello", 0),
+        legacy_record("Bob", "hi", 1500),
+        legacy_record("Alice", "agenda", 4000),
+        legacy_record("Bob", "indexed", 6000, chunk_index=7),
+    ]
+    alice = pack_transcript({"chunk_index": 8, "timestamp_ms": 5000, "text": "new alice"})
+    bob = pack_transcript({"chunk_index": 9, "timestamp_ms": 2000, "text": "new bob"})
+
+    # (name, speakers, their sets' replies for the filter, filters, expected)
+    cases = [
+        ("all", ["Alice", "Bob"], [[alice], [bob]], {}, ["hello", "hi", "new bob", "agenda", "new alice", "indexed"]),
+        ("window", ["Alice", "Bob"], [[], [bob]], {"start_ms": 1500, "end_ms": 5000}, ["hi", "new bob", "agenda"]),
+        ("speaker", ["Alice"], [[alice]], {"speakers": ["Alice"]}, ["hello", "agenda", "new alice"]),
+    ]
+
+    errors = []
+    for name, speakers, replies, filters, expected in cases:
+        try:
+            merged = merge_transcripts(
+                speakers,
+                replies,
+                unpack_legacy_transcripts(legacy, filters.get("start_ms"), filters.get("end_ms"), filters.get("speakers")),
+            )
+        except Exception as e:
+            errors.append(f"{name}: {e!r}")
+            continue
+
+        texts = [transcript["text"] for transcript in merged]
+        if texts != expected:
+            errors.append(f"{name}: got {texts}, expected {expected}")
+    return errors
+
+def main():
+    errors = check()
+    for error in errors:
+        print(error)
+    print("ok" if not errors else f"{len(errors)} failed")
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()